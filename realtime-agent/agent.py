@@ -0,0 +1,768 @@
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+from time import monotonic
+
+import numpy as np
+
+from backtest import data_hash
+from evolution import Deep_Evolution_Strategy
+from metrics import SampledLogger, stage
+from model import Model
+from scaler import AffineScaler
+from simulate import simulate
+from state import StreamingState, as_parameters, get_state, get_states
+
+window_size = 20
+
+log = SampledLogger(logging.getLogger(__name__))
+
+
+class AgentView:
+    """
+    what the read endpoints serve, published by the writer after every
+    change, version goes up with every change
+
+    publishing costs the same whatever the inventory size: the view keeps a
+    slice of the stream's inventory log and a copy of the window, and builds
+    the inventory and queue lists on first read
+    """
+
+    __slots__ = (
+        'balance', 'last_decision', 'version', '_inventory_slice', '_window',
+        '_inventory', '_queue',
+    )
+
+    def __init__(self, balance, inventory_slice, window, last_decision, version):
+        self.balance = balance
+        self.last_decision = last_decision
+        self.version = version
+        self._inventory_slice = inventory_slice
+        self._window = window
+        self._inventory = None
+        self._queue = None
+
+    @property
+    def inventory_count(self):
+        _, start, stop = self._inventory_slice
+        return stop - start
+
+    @property
+    def inventory(self):
+        if self._inventory is None:
+            bought, start, stop = self._inventory_slice
+            self._inventory = bought[start:stop]
+        return self._inventory
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = self._window.T.tolist()
+        return self._queue
+
+
+# how often Agent.wait checks a state_store for changes by other processes
+STORE_POLL_SECONDS = 0.5
+
+
+def linear_policy(weights_population, n_features):
+    """
+    the model is linear, so its logits are windows @ window weights + bias
+    plus the three rollout inputs @ rollout weights. Returns the three for
+    every member, (members, n_features, 3), (members, 1, 3), (members, 3, 3)
+    """
+    w_input, w_output, b_input, b_output = (
+        np.stack([weights[index] for weights in weights_population])
+        for index in range(4)
+    )
+    return (
+        np.matmul(w_input[:, :n_features], w_output),
+        np.matmul(b_input, w_output) + b_output,
+        np.matmul(w_input[:, n_features:], w_output),
+    )
+
+
+def state_steps(stop, skip, start = 0):
+    """
+    the steps of a replay over prices start to stop, and for each the index
+    of the window its state is taken from, the previous step + 1 as in
+    get_reward
+    """
+    steps = np.arange(start, stop - 1, skip, dtype = np.int64)
+    state_index = np.concatenate([[start], steps[:-1] + 1]).astype(np.int64)
+    return steps, state_index[: len(steps)]
+
+
+def sample_episodes(length, episode_length, count, rng = np.random):
+    """
+    count (start, stop) windows of episode_length prices drawn uniformly
+    from a series of length, the whole series when it is not longer
+    """
+    if episode_length is None or episode_length >= length:
+        return [(0, length)]
+    starts = rng.randint(0, length - episode_length + 1, size = count)
+    return [(int(start), int(start) + episode_length) for start in starts]
+
+
+def population_reward(
+    weights_population,
+    parameters,
+    skip,
+    scaled_capital,
+    mean,
+    std,
+    windows = None,
+    episodes = None,
+):
+    """
+    Agent.get_reward for every member of weights_population at once,
+    parameters is the scaled (n_parameters, length) block, close first,
+    windows its get_states rows when already computed
+
+    with episodes, a list of (start, stop), each member is scored on every
+    episode, starting from scaled_capital with an empty inventory and with
+    the windows of the full series, and gets the mean reward. By default
+    the one episode is the whole series
+
+    only the last three inputs, inventory size, mean bought price and money,
+    depend on the rollout. The window part of the logits of every step and
+    member comes from one matmul, and simulate.py trades each member over
+    them adding the 3x3 rollout term per step
+    """
+    trend = parameters[0]
+    if windows is None:
+        windows = get_states(parameters, window_size = window_size)
+    if episodes is None:
+        episodes = [(0, len(trend))]
+    replays = [state_steps(stop, skip, start) for start, stop in episodes]
+    steps = np.concatenate([steps for steps, _ in replays])
+    state_index = np.concatenate([state_index for _, state_index in replays])
+    bounds = np.cumsum([0] + [len(steps) for steps, _ in replays])
+    w_windows, bias, w_rollout = linear_policy(weights_population, windows.shape[1])
+    logits = np.matmul(windows[state_index], w_windows)
+    logits += bias
+    prices = trend[steps]
+
+    initial_money = scaled_capital
+    rewards = np.zeros(len(weights_population))
+    for member in range(len(weights_population)):
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            starting_money, invests, _, _ = simulate(
+                logits[member, lo:hi],
+                w_rollout[member],
+                prices[lo:hi],
+                initial_money,
+                mean,
+                std,
+            )
+            invest = np.mean(invests) if len(invests) else 0
+            score = (starting_money - initial_money) / initial_money * 100
+            rewards[member] += invest * 0.7 + score * 0.3
+    return rewards / len(episodes)
+
+
+class Agent:
+    """
+    trading state changes under a per agent lock, so ticks for one agent are
+    applied one at a time in arrival order. After every change the agent
+    publishes an immutable AgentView, and readers take it without the lock
+    """
+
+    POPULATION_SIZE = 15
+    SIGMA = 0.1
+    LEARNING_RATE = 0.03
+
+    def __init__(self, model, timeseries, skip, initial_money, real_trend, minmax):
+        self.model = model
+        self.timeseries = timeseries
+        self.skip = skip
+        self.real_trend = real_trend
+        self.initial_money = initial_money
+        self.es = Deep_Evolution_Strategy(
+            self.model.get_weights(),
+            self.get_reward,
+            self.POPULATION_SIZE,
+            self.SIGMA,
+            self.LEARNING_RATE,
+            batch_reward_function = self.get_reward_batch,
+        )
+        self.minmax = minmax
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        # tells versions of this agent apart from an earlier one's
+        self._epoch = os.urandom(4).hex()
+        # set by AgentRegistry to share trading state between processes, see
+        # store.py, store_version is the stored version this agent holds
+        self.symbol = None
+        self.state_store = None
+        self.store_version = 0
+        # (start, stop) windows get_reward_batch scores on, None for the
+        # whole series, picked before every epoch by fit
+        self.episodes = None
+        with self._lock:
+            self._initiate()
+
+    def _initiate(self):
+        # one (n_parameters, length) float64 block, i assume first row is the
+        # close value, trend is a view of that row. Arrays already in that
+        # layout, like the data.bin rows, are used without a copy
+        self._parameters = as_parameters(self.timeseries)
+        self.timeseries = self._parameters
+        self.trend = self._parameters[0]
+        self.real_trend = np.asarray(self.real_trend, dtype = np.float64)
+        self._windows = None
+        self._mean = np.mean(self.trend)
+        self._std = np.std(self.trend)
+        self.scaler = AffineScaler.from_minmax(self.minmax)
+        self._data_hash = None
+        self._stream = StreamingState(
+            len(self._parameters), window_size, self._mean, self._std
+        )
+        self._capital = self.initial_money
+        self._scaled_capital = self.scaler.transform_value(self._capital)
+        self._last_decision = None
+        self._publish()
+
+    def _publish(self):
+        # called with the lock held
+        if self.state_store is None:
+            self._version += 1
+            version = self._version
+        else:
+            version = self.store_version
+        self._view = AgentView(
+            self._capital,
+            self._stream.inventory_slice(),
+            self._stream.window.copy(),
+            dict(self._last_decision) if self._last_decision else None,
+            version,
+        )
+        self._changed.notify_all()
+
+    @property
+    def epoch(self):
+        """
+        with view().version, identifies the trading state across processes
+        """
+        if self.state_store is not None:
+            return self.state_store.epoch(self.symbol)
+        return self._epoch
+
+    @property
+    def data_hash(self):
+        """
+        digest of the data and scaler, see backtest.data_hash, computed once
+        per data
+        """
+        digest = self._data_hash
+        if digest is None:
+            digest = self._data_hash = data_hash(self)
+        return digest
+
+    def _change(self, change):
+        """
+        change() under the lock, kept in step with state_store when one is
+        set, where it may run more than once, see StateStore.change. The
+        result is published
+        """
+        with self._lock:
+            if self.state_store is None:
+                result = change()
+            else:
+                result = self.state_store.change(self.symbol, self, change)
+            self._publish()
+        return result
+
+    def view(self):
+        """
+        the AgentView after the latest complete change, never blocks unless
+        a state_store has to be checked for changes by other processes
+        """
+        if self.state_store is not None:
+            with self._lock:
+                self.state_store.refresh(self.symbol, self)
+                if self._view.version != self.store_version:
+                    self._publish()
+        return self._view
+
+    def wait(self, version, timeout):
+        """
+        the first view whose version is not version, or the latest view
+        after timeout seconds
+        """
+        if not math.isfinite(timeout):
+            # NaN never compares as elapsed, it would spin forever
+            timeout = 0.0
+        deadline = monotonic() + timeout
+        while True:
+            view = self.view()
+            remaining = deadline - monotonic()
+            if view.version != version or remaining <= 0:
+                return view
+            if self.state_store is not None:
+                # other processes do not notify, look again shortly
+                remaining = min(remaining, STORE_POLL_SECONDS)
+            with self._changed:
+                if self._view.version == version:
+                    self._changed.wait(remaining)
+
+    def reset_capital(self, capital):
+        self._change(lambda: self._reset(capital))
+
+    def _reset(self, capital):
+        if capital:
+            self._capital = capital
+        self._scaled_capital = self.scaler.transform_value(self._capital)
+        self._last_decision = None
+        self._stream.reset()
+
+    def snapshot(self):
+        """
+        trading state as (arrays, values), values are plain JSON
+        """
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        stream = self._stream
+        arrays = {
+            'buffer': stream._buffer.copy(),
+            'inventory': np.array(stream.inventory, dtype = np.float64),
+        }
+        values = {
+            'position': stream._position,
+            'count': stream.count,
+            'inventory_sum': float(stream._inventory_sum),
+            'capital': float(self._capital),
+            'scaled_capital': float(self._scaled_capital),
+            'last_decision': self._last_decision,
+            'data': self.data_hash,
+        }
+        return arrays, values
+
+    def restore(self, arrays, values):
+        """
+        put back a snapshot of an agent over the same data
+        """
+        with self._lock:
+            self._restore(arrays, values)
+            self._publish()
+
+    def _restore(self, arrays, values):
+        if (
+            values.get('data') != self.data_hash
+            or arrays['buffer'].shape != self._stream._buffer.shape
+        ):
+            raise ValueError('snapshot does not match the agent data')
+        self._stream.restore(
+            arrays['buffer'],
+            values['position'],
+            values['count'],
+            arrays['inventory'].tolist(),
+            values['inventory_sum'],
+        )
+        self._capital = values['capital']
+        self._scaled_capital = values['scaled_capital']
+        self._last_decision = values.get('last_decision')
+
+    def trade(self, data):
+        """
+        you need to make sure the data is [close, volume]
+        """
+        with stage('scale'):
+            scaled_data = self.scaler.transform_row(data)
+
+        def change():
+            result = self._last_decision = self._trade(data[0], scaled_data)
+            return result
+
+        return self._change(change)
+
+    def trade_batch(self, ticks):
+        """
+        trade a list of [close, volume] ticks in order, scaling them in one go
+        """
+        if not len(ticks):
+            # nothing changes, not even the version
+            view = self.view()
+            return {'decisions': [], 'balance': view.balance, 'inventory': view.inventory}
+        with stage('scale'):
+            scaled = self.scaler.transform(ticks)
+
+        # one change for the whole batch, so it is not interleaved with other ticks
+        def change():
+            decisions = [
+                self._trade(tick[0], scaled_data)
+                for tick, scaled_data in zip(ticks, scaled)
+            ]
+            self._last_decision = decisions[-1]
+            return {
+                'decisions': decisions,
+                'balance': self._capital,
+                'inventory': self._stream.inventory,
+            }
+
+        return self._change(change)
+
+    def _trade(self, real_close, scaled_data):
+        close = scaled_data[0]
+        with stage('state'):
+            self._stream.push(scaled_data)
+        if not self._stream.ready:
+            return {
+                'status': 'data not enough to trade',
+                'action': 'fail',
+                'balance': self._capital,
+                'timestamp': str(datetime.now()),
+            }
+        with stage('state'):
+            state = self._stream.get_state(self._scaled_capital)
+        with stage('predict'):
+            action, prob = self.act_softmax(state)
+        log.debug('probabilities %s', prob)
+        if action == 1 and self._scaled_capital >= close:
+            self._stream.buy(close)
+            self._scaled_capital -= close
+            self._capital -= real_close
+            return {
+                'status': 'buy 1 unit, cost %f' % (real_close),
+                'action': 'buy',
+                'balance': self._capital,
+                'timestamp': str(datetime.now()),
+            }
+        elif action == 2 and self._stream.len_inventory:
+            bought_price = self._stream.sell()
+            self._scaled_capital += close
+            self._capital += real_close
+            scaled_bought_price = self.scaler.inverse_value(bought_price)
+            try:
+                invest = (
+                    (real_close - scaled_bought_price) / scaled_bought_price
+                ) * 100
+            except:
+                invest = 0
+            return {
+                'status': 'sell 1 unit, price %f' % (real_close),
+                'investment': invest,
+                'gain': real_close - scaled_bought_price,
+                'balance': self._capital,
+                'action': 'sell',
+                'timestamp': str(datetime.now()),
+            }
+        else:
+            return {
+                'status': 'do nothing',
+                'action': 'nothing',
+                'balance': self._capital,
+                'timestamp': str(datetime.now()),
+            }
+
+    def change_data(self, timeseries, skip, initial_money, real_trend, minmax):
+        self.timeseries = timeseries
+        self.skip = skip
+        self.initial_money = initial_money
+        self.real_trend = real_trend
+        self.minmax = minmax
+        with self._lock:
+            self._initiate()
+
+    def act(self, sequence):
+        decision = self.model.predict(np.array(sequence))
+
+        return np.argmax(decision[0])
+
+    def act_softmax(self, sequence):
+        actions, prob = self.model.predict_softmax(sequence)
+
+        return actions[0], prob[0]
+
+    @property
+    def windows(self):
+        """
+        window features of every index of the data, built once per data and
+        shared by every reward and backtest over it
+        """
+        windows = self._windows
+        if windows is None:
+            windows = get_states(self._parameters, window_size = window_size)
+            windows.flags.writeable = False
+            self._windows = windows
+        return windows
+
+    def get_state(self, t, inventory, capital, timeseries):
+        if timeseries is self._parameters:
+            state = self.windows[t : t + 1]
+        else:
+            state = get_state(timeseries, t)
+        len_inventory = len(inventory)
+        if len_inventory:
+            mean_inventory = np.mean(inventory)
+        else:
+            mean_inventory = 0
+        z_inventory = (mean_inventory - self._mean) / self._std
+        z_capital = (capital - self._mean) / self._std
+        concat_parameters = np.concatenate(
+            [state, [[len_inventory, z_inventory, z_capital]]], axis = 1
+        )
+        return concat_parameters
+
+    def get_reward(self, weights):
+        initial_money = self._scaled_capital
+        starting_money = initial_money
+        invests = []
+        self.model.weights = weights
+        inventory = []
+        state = self.get_state(0, inventory, starting_money, self._parameters)
+        # python floats index and add faster than numpy scalars
+        trend = self.trend.tolist()
+
+        for t in range(0, len(trend) - 1, self.skip):
+            action = self.act(state)
+            if action == 1 and starting_money >= trend[t]:
+                inventory.append(trend[t])
+                starting_money -= trend[t]
+
+            elif action == 2 and len(inventory):
+                bought_price = inventory.pop(0)
+                starting_money += trend[t]
+                invest = ((trend[t] - bought_price) / bought_price) * 100
+                invests.append(invest)
+
+            state = self.get_state(
+                t + 1, inventory, starting_money, self._parameters
+            )
+        invests = np.mean(invests)
+        if np.isnan(invests):
+            invests = 0
+        score = (starting_money - initial_money) / initial_money * 100
+        return invests * 0.7 + score * 0.3
+
+    def get_reward_batch(self, weights_population):
+        """
+        same reward as get_reward for every member, stepping the whole
+        population through the market together with batched matmuls, the
+        mean over self.episodes when set
+        """
+        return population_reward(
+            weights_population,
+            self._parameters,
+            self.skip,
+            self._scaled_capital,
+            self._mean,
+            self._std,
+            self.windows,
+            self.episodes,
+        )
+
+    def fit(
+        self,
+        iterations,
+        checkpoint,
+        batched = True,
+        workers = None,
+        episode_length = None,
+        episodes = 1,
+        seed = None,
+    ):
+        """
+        workers > 1 scores the population on a process pool, batched = False
+        scores members one by one in this process
+
+        with episode_length, every epoch draws episodes windows of that many
+        prices and scores the whole population on the same ones, so an epoch
+        costs the same however long the series is. seed fixes the draws.
+        The reward printed every checkpoint is still get_reward over the
+        whole series
+        """
+        if episode_length is not None:
+            if not batched and not (workers and workers > 1):
+                raise ValueError('episodes are scored by the batched reward only')
+            if episodes < 1:
+                raise ValueError('episodes must be at least 1, got %r' % (episodes,))
+            if not 0 < episode_length <= len(self.trend):
+                raise ValueError(
+                    'episode_length must be between 1 and the %d prices of the series, got %r'
+                    % (len(self.trend), episode_length)
+                )
+            rng = np.random if seed is None else np.random.RandomState(seed)
+
+            def pick_episodes():
+                self.episodes = sample_episodes(
+                    len(self.trend), episode_length, episodes, rng
+                )
+
+            self.es.before_epoch = pick_episodes
+        try:
+            if workers and workers > 1:
+                from parallel import RewardPool
+
+                with RewardPool(self, workers) as pool:
+                    self.es.batch_reward_function = pool
+                    try:
+                        self.es.train(iterations, print_every = checkpoint)
+                    finally:
+                        self.es.batch_reward_function = self.get_reward_batch
+                return
+            self.es.batch_reward_function = self.get_reward_batch if batched else None
+            self.es.train(iterations, print_every = checkpoint)
+        finally:
+            self.es.before_epoch = None
+            self.episodes = None
+
+    def backtest(self, capital = None):
+        """
+        replay the whole series with the current model from capital, by
+        default initial_money, without printing or logging and without
+        touching the trading state
+
+        returns buy and sell step indices, the gain of every sell, total
+        gains and investment percent, and equity, cash plus inventory at the
+        close of every step
+        """
+        if not capital:
+            capital = self.initial_money
+        if isinstance(self.model, Model):
+            return self._backtest_linear(self.scaler.transform_value(capital), capital)
+        return self._backtest(self.scaler.transform_value(capital), capital)
+
+    def _backtest_linear(self, initial_money, real_initial_money):
+        # _backtest with the decisions from simulate, the real money follows
+        # from the trade steps in the same order of operations as the loop
+        steps, state_index = state_steps(len(self.trend), self.skip)
+        w_windows, bias, w_rollout = linear_policy(
+            [self.model.get_weights()], self.windows.shape[1]
+        )
+        logits = np.matmul(self.windows[state_index], w_windows[0])
+        logits += bias[0]
+        _, _, buys, sells = simulate(
+            logits,
+            w_rollout[0],
+            self.trend[steps],
+            initial_money,
+            self._mean,
+            self._std,
+            buy_until = np.searchsorted(steps, len(self.trend) - 1 - window_size),
+        )
+        real_trend = self.real_trend[steps]
+        changes = np.zeros(len(steps) + 1)
+        changes[0] = real_initial_money
+        changes[buys + 1] = -real_trend[buys]
+        changes[sells + 1] = real_trend[sells]
+        money = np.cumsum(changes)[1:]
+        held = np.zeros(len(steps), dtype = np.int64)
+        held[buys] += 1
+        held[sells] -= 1
+        equity = money + np.cumsum(held) * real_trend
+        real_starting_money = money[-1] if len(steps) else real_initial_money
+        return {
+            'buys': steps[buys].tolist(),
+            'sells': steps[sells].tolist(),
+            'gains': (real_trend[sells] - real_trend[buys[: len(sells)]]).tolist(),
+            'total_gains': real_starting_money - real_initial_money,
+            'investment': (
+                (real_starting_money - real_initial_money) / real_initial_money
+            ) * 100,
+            'equity': equity.tolist(),
+        }
+
+    def buy(self, verbose = True):
+        result = self._backtest(self._scaled_capital, self.initial_money, verbose)
+        return result['buys'], result['sells'], result['total_gains'], result['investment']
+
+    def _backtest(self, initial_money, real_initial_money, verbose = False):
+        starting_money = initial_money
+        real_starting_money = real_initial_money
+        inventory = []
+        real_inventory = []
+        state = self.get_state(0, inventory, starting_money, self._parameters)
+        states_sell = []
+        states_buy = []
+        gains = []
+        equity = []
+        trend = self.trend.tolist()
+        real_trend = self.real_trend.tolist()
+
+        for t in range(0, len(trend) - 1, self.skip):
+            action, prob = self.act_softmax(state)
+            if verbose:
+                log.debug('%d %s', t, prob)
+
+            if action == 1 and starting_money >= trend[t] and t < (len(trend) - 1 - window_size):
+                inventory.append(trend[t])
+                real_inventory.append(real_trend[t])
+                real_starting_money -= real_trend[t]
+                starting_money -= trend[t]
+                states_buy.append(t)
+                if verbose:
+                    print(
+                        'day %d: buy 1 unit at price %f, total balance %f'
+                        % (t, real_trend[t], real_starting_money)
+                    )
+
+            elif action == 2 and len(inventory):
+                bought_price = inventory.pop(0)
+                real_bought_price = real_inventory.pop(0)
+                starting_money += trend[t]
+                real_starting_money += real_trend[t]
+                states_sell.append(t)
+                gains.append(real_trend[t] - real_bought_price)
+                try:
+                    invest = (
+                        (real_trend[t] - real_bought_price)
+                        / real_bought_price
+                    ) * 100
+                except:
+                    invest = 0
+                if verbose:
+                    print(
+                        'day %d, sell 1 unit at price %f, investment %f %%, total balance %f,'
+                        % (t, real_trend[t], invest, real_starting_money)
+                    )
+            equity.append(real_starting_money + len(real_inventory) * real_trend[t])
+            state = self.get_state(
+                t + 1, inventory, starting_money, self._parameters
+            )
+
+        invest = (
+            (real_starting_money - real_initial_money) / real_initial_money
+        ) * 100
+        total_gains = real_starting_money - real_initial_money
+        return {
+            'buys': states_buy,
+            'sells': states_sell,
+            'gains': gains,
+            'total_gains': total_gains,
+            'investment': invest,
+            'equity': equity,
+        }
+
+
+def agent_from_parameters(model, parameters, scaler, skip = 1):
+    """
+    Agent over raw [close, volume] columns and the scaler fitted on them
+    """
+    parameters = np.asarray(parameters, dtype = np.float64)
+    return Agent(
+        model = model,
+        timeseries = scaler.transform(parameters.T).T,
+        skip = skip,
+        initial_money = np.max(parameters[0]) * 2,
+        # a view, of the data.bin mapping when the parameters come from there
+        real_trend = parameters[0],
+        minmax = scaler,
+    )
+
+
+def agent_from_csv(model, path, skip = 1):
+    """
+    Agent over a symbol CSV with Close and Volume columns, scaled the same
+    way as the model was trained
+    """
+    from dataset import FEATURE_RANGE, read_columns
+
+    parameters = np.array(read_columns(path))
+    scaler = AffineScaler.fit(parameters.T, FEATURE_RANGE)
+    return agent_from_parameters(model, parameters, scaler, skip)
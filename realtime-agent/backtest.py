@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _update(digest, arrays):
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(('%s%s' % (array.dtype.str, array.shape)).encode())
+        digest.update(array.data)
+
+
+# model -> (arrays, digest), the arrays the digest was taken over are kept so
+# their ids cannot be reused
+_model_hashes = weakref.WeakKeyDictionary()
+_model_hashes_lock = threading.Lock()
+
+
+def model_hash(model):
+    """
+    digest of the weights, and of the per column scales of a quantized model
+
+    taken once per model and again only when its weight arrays are
+    replaced, training and set_weights replace arrays and nothing changes
+    them in place
+    """
+    arrays = list(model.get_weights()) + list(getattr(model, 'scales', []))
+    with _model_hashes_lock:
+        cached = _model_hashes.get(model)
+    if (
+        cached is not None
+        and len(cached[0]) == len(arrays)
+        and all(a is b for a, b in zip(cached[0], arrays))
+    ):
+        return cached[1]
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(type(model).__name__.encode())
+    _update(digest, model.get_weights())
+    _update(digest, getattr(model, 'scales', []))
+    digest = digest.hexdigest()
+    with _model_hashes_lock:
+        _model_hashes[model] = (arrays, digest)
+    return digest
+
+
+def data_hash(agent):
+    """
+    digest of the series an agent replays, scaled and real closes, and of
+    the scaler that maps ticks onto them
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    _update(
+        digest,
+        [
+            agent._parameters,
+            np.asarray(agent.real_trend, dtype = np.float64),
+            agent.scaler.scale_,
+            agent.scaler.min_,
+        ],
+    )
+    return digest.hexdigest()
+
+
+class BacktestCache:
+    """
+    Agent.backtest results in an LRU of max_entries, keyed by model hash,
+    data hash and parameters, so the same backtest runs once until the
+    weights or the data change
+
+    two requests missing on the same key at once both run it, the second
+    result replaces the first
+    """
+
+    def __init__(self, max_entries = 128):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, agent, capital):
+        capital = float(capital or agent.initial_money)
+        return '%s-%s-%d-%r' % (model_hash(agent.model), agent.data_hash, agent.skip, capital)
+
+    def get(self, agent, capital = None, key = None):
+        """
+        agent.backtest(capital), from the cache when it was run before
+        """
+        if key is None:
+            key = self.key(agent, capital)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = agent.backtest(capital)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last = False)
+        return result
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+ES convergence benchmark.
+
+Trains a freshly initialized model on every CSV with each update rule, see
+Deep_Evolution_Strategy, and reports the epochs each rule needs to reach the
+target: the mean whole-series reward of plain ES over its last 10 of --epochs
+epochs. Every rule starts from the same weights with the same random draws.
+
+    python bench_convergence.py --epochs 60 --seeds 2
+"""
+
+import glob
+import os
+import statistics
+import sys
+
+import numpy as np
+
+from agent import agent_from_csv, window_size
+from evolution import Adam, Momentum, centered_rank_fitness, zscore_fitness
+from model import Model
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (fitness, mirrored, optimizer factory, learning rate). Centered
+# ranks spread about a third as wide as z-scores and momentum adds up about
+# ten steps, the learning rates make up for that. Adam moves every weight by
+# about its learning rate, plain ES steps here are of the same order
+RULES = {
+    'es': (zscore_fitness, False, None, 0.03),
+    'rank': (centered_rank_fitness, False, None, 0.1),
+    'mirrored': (zscore_fitness, True, None, 0.03),
+    'rank+mirrored': (centered_rank_fitness, True, None, 0.1),
+    'momentum': (zscore_fitness, False, lambda: Momentum(0.9, weight_decay = 0.001), 0.003),
+    'adam': (zscore_fitness, False, lambda: Adam(weight_decay = 0.001), 0.1),
+    'rank+mirrored+adam': (
+        centered_rank_fitness, True, lambda: Adam(weight_decay = 0.001), 0.1
+    ),
+}
+
+
+def train_curve(path, rule, epochs, seed):
+    """
+    whole-series reward after every epoch of training with rule
+    """
+    fitness, mirrored, optimizer, learning_rate = RULES[rule]
+    np.random.seed(seed)
+    model = Model(window_size * 2 * 2 - 1, 500, 3)
+    agent = agent_from_csv(model, path)
+    es = agent.es
+    es.fitness = fitness
+    es.mirrored = mirrored
+    es.optimizer = optimizer() if optimizer else None
+    es.learning_rate = learning_rate
+    es.batch_reward_function = agent.get_reward_batch
+    curve = []
+    for _ in range(epochs):
+        es.step()
+        curve.append(agent.get_reward_batch([es.get_weights()])[0])
+    return curve
+
+
+def epochs_to(curve, target):
+    for epoch, reward in enumerate(curve, 1):
+        if reward >= target:
+            return epoch
+    return None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--data-dir', default = script_dir, help = 'directory of the CSVs')
+    parser.add_argument('--epochs', type = int, default = 60)
+    parser.add_argument('--seeds', type = int, default = 1, help = 'runs per CSV and rule')
+    parser.add_argument('--rules', nargs = '+', default = list(RULES), choices = list(RULES))
+    args = parser.parse_args()
+
+    rules = ['es'] + [rule for rule in args.rules if rule != 'es']
+    paths = sorted(glob.glob(os.path.join(args.data_dir, '*.csv')))
+    width = max(len(rule) for rule in rules) + 1
+    print('%-10s %8s ' % ('csv', 'target') + ' '.join('%*s' % (width, rule) for rule in rules))
+    reached = {rule: [] for rule in rules}
+    for path in paths:
+        for seed in range(args.seeds):
+            curves = {rule: train_curve(path, rule, args.epochs, seed) for rule in rules}
+            target = np.mean(curves['es'][-10:])
+            cells = []
+            for rule in rules:
+                epochs = epochs_to(curves[rule], target)
+                # a rule that never gets there counts as one epoch past the run
+                reached[rule].append(epochs or args.epochs + 1)
+                cells.append('%*s' % (width, epochs or '-'))
+            print(
+                '%-10s %8.2f ' % (os.path.basename(path)[:-4], target) + ' '.join(cells)
+            )
+    print(
+        '%-10s %8s ' % ('median', '')
+        + ' '.join('%*s' % (width, statistics.median(reached[rule])) for rule in rules)
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
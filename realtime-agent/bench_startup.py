@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark.
+
+Starts a fresh interpreter per run, imports an entry point and answers one
+/trade, the work a serverless cold start pays before its first response.
+Exits non-zero when the median exceeds the budget or when pandas or sklearn
+get imported on the way, so it can gate a deploy.
+
+    python bench_startup.py --runs 5 --budget 1.0
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+response = module.app.test_client().get('/trade?data=[33.42,13407500]')
+assert response.status_code == 200, response.get_data(as_text = True)
+done = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_request': done - imported,
+    'heavy_modules': sorted(name for name in ('pandas', 'sklearn') if name in sys.modules),
+}))
+'''
+
+
+def run_once(entry):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, entry],
+        cwd = script_dir,
+        capture_output = True,
+        text = True,
+        check = True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--entry', default = os.path.join('api', 'index.py'))
+    parser.add_argument('--runs', type = int, default = 5)
+    parser.add_argument(
+        '--budget', type = float, default = 1.0,
+        help = 'maximum median seconds from process start to first response',
+    )
+    args = parser.parse_args()
+
+    results = [run_once(args.entry) for _ in range(args.runs)]
+    for key in ('import', 'first_request', 'total'):
+        print(
+            '%-14s median %.1f ms, min %.1f ms'
+            % (
+                key,
+                statistics.median(r[key] for r in results) * 1000,
+                min(r[key] for r in results) * 1000,
+            )
+        )
+    failed = False
+    heavy = sorted({name for r in results for name in r['heavy_modules']})
+    if heavy:
+        print('✗ cold start imports %s' % ', '.join(heavy))
+        failed = True
+    total = statistics.median(r['total'] for r in results)
+    if total > args.budget:
+        print('✗ median cold start %.3fs is over the %.3fs budget' % (total, args.budget))
+        failed = True
+    if not failed:
+        print('✓ cold start within %.3fs' % args.budget)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
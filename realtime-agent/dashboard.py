@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class StaticAsset:
+    """
+    a file served from memory with a strong ETag and Last-Modified, answered
+    with 304 when the client already has it
+
+    gzip and, when the brotli package is installed, brotli variants are
+    compressed once on first use and picked by Accept-Encoding. Headers are
+    built once per variant, so a request only looks up its variant and
+    compares validators
+    """
+
+    # distinct Accept-Encoding values remembered, browsers send a handful
+    MAX_ACCEPT_ENTRIES = 64
+
+    def __init__(self, path, mimetype):
+        self.path = path
+        self.mimetype = mimetype
+        with open(path, 'rb') as fopen:
+            self.body = fopen.read()
+        self.last_modified = int(os.path.getmtime(path))
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self._variants = None
+        self._encodings = {}
+        self._lock = threading.Lock()
+
+    def _compress(self):
+        bodies = {None: self.body}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(self.body, quality = 11)
+        bodies['gzip'] = gzip.compress(self.body, compresslevel = 9, mtime = 0)
+        variants = {}
+        for encoding, body in bodies.items():
+            # only keep what is actually smaller
+            if encoding is not None and len(body) >= len(self.body):
+                continue
+            # every representation needs its own strong validator
+            etag = self.etag if encoding is None else '%s-%s' % (self.etag, encoding)
+            headers = [
+                ('ETag', quote_etag(etag)),
+                ('Last-Modified', http_date(self.last_modified)),
+                # cacheable, but revalidated on every load so a deploy shows up at once
+                ('Cache-Control', 'public, no-cache'),
+                ('Vary', 'Accept-Encoding'),
+            ]
+            if encoding is not None:
+                headers.append(('Content-Encoding', encoding))
+            variants[encoding] = (body, etag, headers)
+        return variants
+
+    @property
+    def variants(self):
+        if self._variants is None:
+            with self._lock:
+                if self._variants is None:
+                    self._variants = self._compress()
+        return self._variants
+
+    def _encoding(self, accept):
+        encoding = self._encodings.get(accept, False)
+        if encoding is False:
+            accepted = parse_accept_header(accept)
+            encoding = next(
+                (name for name in self.variants if name and accepted[name] > 0), None
+            )
+            if len(self._encodings) < self.MAX_ACCEPT_ENTRIES:
+                self._encodings[accept] = encoding
+        return encoding
+
+    def _not_modified(self, etag):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return parse_etags(if_none_match).contains_weak(etag)
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            since = parse_date(if_modified_since)
+            return since is not None and since.timestamp() >= self.last_modified
+        return False
+
+    def response(self):
+        body, etag, headers = self.variants[
+            self._encoding(request.headers.get('Accept-Encoding', ''))
+        ]
+        if self._not_modified(etag):
+            return Response(status = 304, headers = headers)
+        return Response(body, headers = headers, mimetype = self.mimetype)
+
+
+_dashboard = None
+
+
+def dashboard():
+    """
+    the trading dashboard, static/index.html
+    """
+    global _dashboard
+    if _dashboard is None:
+        _dashboard = StaticAsset(
+            os.path.join(script_dir, 'static', 'index.html'), 'text/html'
+        )
+    return _dashboard.response()
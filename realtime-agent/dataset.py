@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Preprocessed symbol data.
+
+Reads the Close and Volume columns of the symbol CSVs without pandas and
+packs them, with the fitted scaler of each symbol, into one memory-mapped
+data.bin next to the model, so a cold start builds an agent without parsing
+CSVs or importing pandas and sklearn. Each symbol records the CRC32 of the
+CSV it was built from and is ignored once the CSV changes.
+
+    python dataset.py
+"""
+
+import csv
+import os
+import zlib
+
+import numpy as np
+
+from modelfile import load_arrays, save_arrays
+
+FEATURE_RANGE = (100, 200)
+COLUMNS = ('Close', 'Volume')
+
+
+def read_columns(path, columns = COLUMNS):
+    """
+    list of floats per column, the same values pandas.read_csv parses
+    """
+    with open(path, newline = '') as fopen:
+        reader = csv.reader(fopen)
+        header = next(reader)
+        indices = [header.index(column) for column in columns]
+        values = [[] for _ in columns]
+        for row in reader:
+            if not row:
+                continue
+            for value, index in zip(values, indices):
+                value.append(float(row[index]))
+    return values
+
+
+def file_crc(path):
+    with open(path, 'rb') as fopen:
+        return zlib.crc32(fopen.read())
+
+
+def build_dataset(data_dir, path):
+    """
+    write every <SYMBOL>.csv in data_dir to path
+    """
+    from scaler import AffineScaler
+
+    arrays = {}
+    symbols = {}
+    for name in sorted(os.listdir(data_dir)):
+        if not name.lower().endswith('.csv'):
+            continue
+        symbol = name[:-4].upper()
+        csv_path = os.path.join(data_dir, name)
+        close, volume = read_columns(csv_path)
+        scaler = AffineScaler.fit(np.array([close, volume]).T, FEATURE_RANGE)
+        arrays[symbol + '/parameters'] = np.array([close, volume])
+        arrays[symbol + '/scale'] = scaler.scale_
+        arrays[symbol + '/offset'] = scaler.min_
+        symbols[symbol] = file_crc(csv_path)
+    save_arrays(path, arrays, {'kind': 'dataset', 'symbols': symbols})
+    return sorted(symbols)
+
+
+class Dataset:
+    """
+    read-only view over a data.bin, loads nothing until a symbol is asked for
+    """
+
+    def __init__(self, path, verify = True):
+        self.path = path
+        self.arrays, metadata = load_arrays(path, verify = verify)
+        self.crcs = metadata.get('symbols', {})
+
+    def get(self, symbol, csv_path = None):
+        """
+        (parameters, scaler) of symbol or None, when csv_path is given the
+        entry must have been built from that exact file
+        """
+        from scaler import AffineScaler
+
+        if symbol not in self.crcs:
+            return None
+        if csv_path is not None and file_crc(csv_path) != self.crcs[symbol]:
+            return None
+        return (
+            self.arrays[symbol + '/parameters'],
+            AffineScaler(self.arrays[symbol + '/scale'], self.arrays[symbol + '/offset']),
+        )
+
+
+def main():
+    import argparse
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--data-dir', default = script_dir, help = 'directory of the CSVs')
+    parser.add_argument(
+        '--output', default = os.path.join(script_dir, 'data.bin'), help = 'output file'
+    )
+    args = parser.parse_args()
+
+    symbols = build_dataset(args.data_dir, args.output)
+    print('wrote %s: %s' % (args.output, ', '.join(symbols)))
+
+
+if __name__ == '__main__':
+    main()
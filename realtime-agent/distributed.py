@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Seed based distributed evolution strategy.
+
+The coordinator draws one integer seed per population member and sends
+seeds to the workers, the workers rebuild the noise from the seeds, score
+the jittered weights on their local copy of the data and answer with one
+reward per seed. The coordinator then broadcasts every (seed, reward) pair
+and each node applies the same update to its own weights, so apart from
+the initial weights at handshake nothing but seeds and rewards crosses
+the wire.
+
+The update rule, fitness shaping, mirrored sampling and optimizer, is sent
+at handshake and rebuilt on every worker, see update_rule. Optimizers start
+from fresh state on every node and see the same gradients, so they stay in
+step.
+
+    python distributed.py coordinator --csv TWTR.csv --workers 3 --epochs 50
+    python distributed.py worker --csv TWTR.csv --host 10.0.0.5
+"""
+
+import argparse
+import io
+import json
+import socket
+import struct
+import time
+
+import numpy as np
+
+from backtest import data_hash
+from evolution import Adam, Momentum, centered_rank_fitness, zscore_fitness
+
+PORT = 5005
+
+# update rule parts that can be named in the handshake
+FITNESS = {'zscore': zscore_fitness, 'centered_rank': centered_rank_fitness}
+OPTIMIZERS = {'Momentum': Momentum, 'Adam': Adam}
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('peer closed the connection')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, message, payload = b''):
+    header = json.dumps(dict(message, size = len(payload))).encode()
+    sock.sendall(struct.pack('!I', len(header)) + header + payload)
+
+
+def recv_message(sock):
+    (length,) = struct.unpack('!I', _recv_exact(sock, 4))
+    message = json.loads(_recv_exact(sock, length))
+    payload = _recv_exact(sock, message.pop('size'))
+    return message, payload
+
+
+def dump_weights(weights):
+    buffer = io.BytesIO()
+    np.savez(buffer, *weights)
+    return buffer.getvalue()
+
+
+def load_weights(payload):
+    with np.load(io.BytesIO(payload), allow_pickle = False) as arrays:
+        return [arrays['arr_%d' % i] for i in range(len(arrays.files))]
+
+
+def update_rule(es):
+    """
+    es's update rule as plain JSON for set_update_rule, raises ValueError
+    for a rule a worker could not rebuild exactly: a fitness function or
+    optimizer class not in FITNESS or OPTIMIZERS, or an optimizer that has
+    already taken steps
+    """
+    names = {function: name for name, function in FITNESS.items()}
+    if es.fitness not in names:
+        raise ValueError('fitness %r cannot be sent to workers' % es.fitness)
+    optimizer = None
+    if es.optimizer is not None:
+        kind = type(es.optimizer).__name__
+        if OPTIMIZERS.get(kind) is not type(es.optimizer):
+            raise ValueError('optimizer %s cannot be sent to workers' % kind)
+        state = {k: v for k, v in vars(es.optimizer).items() if k.startswith('_')}
+        if any(value not in (None, 0) for value in state.values()):
+            raise ValueError('optimizer %s has already taken steps' % kind)
+        optimizer = {
+            'type': kind,
+            'options': {k: v for k, v in vars(es.optimizer).items() if not k.startswith('_')},
+        }
+    return {
+        'sigma': es.sigma,
+        'learning_rate': es.learning_rate,
+        'population_size': es.population_size,
+        'fitness': names[es.fitness],
+        'mirrored': bool(es.mirrored),
+        'optimizer': optimizer,
+    }
+
+
+def set_update_rule(es, rule):
+    es.sigma = rule['sigma']
+    es.learning_rate = rule['learning_rate']
+    es.population_size = rule['population_size']
+    es.fitness = FITNESS[rule['fitness']]
+    es.mirrored = rule['mirrored']
+    optimizer = rule['optimizer']
+    es.optimizer = (
+        None if optimizer is None else OPTIMIZERS[optimizer['type']](**optimizer['options'])
+    )
+
+
+class Coordinator:
+    """
+    drives agent.es over remote workers, the agent is only used for the
+    progress reward and to check that workers hold the same data
+    """
+
+    def __init__(self, agent, seed, host = '0.0.0.0', port = PORT):
+        self.agent = agent
+        self.es = agent.es
+        self.es.set_seed(seed)
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        self.workers = []
+
+    def accept(self, workers):
+        """
+        wait for workers with the same data, raises ValueError before the
+        first one when the update rule cannot be sent, see update_rule
+        """
+        rule = update_rule(self.es)
+        expected = data_hash(self.agent)
+        weights = dump_weights(self.es.get_weights())
+        while len(self.workers) < workers:
+            sock, address = self._server.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            message, _ = recv_message(sock)
+            if message.get('data') != expected:
+                send_message(sock, {'type': 'error', 'error': 'data mismatch'})
+                sock.close()
+                continue
+            send_message(sock, dict(rule, type = 'init'), weights)
+            self.workers.append(sock)
+
+    def step(self):
+        members = self.es.next_members()
+        # contiguous slices of the population, one per worker, workers past
+        # the population size sit the epoch out
+        bounds = np.linspace(0, len(members), len(self.workers) + 1).astype(int)
+        scoring = [
+            (sock, lo, hi)
+            for sock, lo, hi in zip(self.workers, bounds[:-1], bounds[1:])
+            if hi > lo
+        ]
+        for sock, lo, hi in scoring:
+            send_message(sock, {'type': 'evaluate', 'members': members[lo:hi]})
+        rewards = []
+        for sock, _, _ in scoring:
+            message, _ = recv_message(sock)
+            rewards.extend(message['rewards'])
+        for sock in self.workers:
+            send_message(sock, {'type': 'update', 'members': members, 'rewards': rewards})
+        population = [self.es.get_member_noise(*member) for member in members]
+        self.es.update(population, np.array(rewards))
+        return members, rewards
+
+    def train(self, epoch = 100, print_every = 1):
+        lasttime = time.time()
+        for i in range(epoch):
+            self.step()
+            if (i + 1) % print_every == 0:
+                print(
+                    'iter %d. reward: %f'
+                    % (i + 1, self.es.reward_function(self.es.get_weights()))
+                )
+        print('time taken to train:', time.time() - lasttime, 'seconds')
+
+    def close(self):
+        for sock in self.workers:
+            try:
+                send_message(sock, {'type': 'stop'})
+            except OSError:
+                pass
+            sock.close()
+        self.workers = []
+        self._server.close()
+
+
+class Worker:
+    """
+    scores seeds for a coordinator and mirrors its weight updates
+    """
+
+    def __init__(self, agent, host, port = PORT):
+        self.agent = agent
+        self.host = host
+        self.port = port
+
+    def run(self):
+        es = self.agent.es
+        with socket.create_connection((self.host, self.port)) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            send_message(sock, {'type': 'hello', 'data': data_hash(self.agent)})
+            message, payload = recv_message(sock)
+            if message['type'] == 'error':
+                raise RuntimeError(message['error'])
+            es.weights[:] = load_weights(payload)
+            set_update_rule(es, message)
+            while True:
+                message, _ = recv_message(sock)
+                if message['type'] == 'evaluate':
+                    population = [es.get_member_noise(*member) for member in message['members']]
+                    rewards = es.get_rewards(population)
+                    send_message(sock, {'type': 'rewards', 'rewards': rewards.tolist()})
+                elif message['type'] == 'update':
+                    population = [es.get_member_noise(*member) for member in message['members']]
+                    es.update(population, np.array(message['rewards']))
+                elif message['type'] == 'stop':
+                    return es.get_weights()
+
+
+def main():
+    from agent import agent_from_csv
+    from model import load_model
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('mode', choices = ['coordinator', 'worker'])
+    parser.add_argument('--csv', default = 'TWTR.csv')
+    parser.add_argument('--model', default = 'model.pkl')
+    parser.add_argument('--host', default = None)
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--workers', type = int, default = 1)
+    parser.add_argument('--epochs', type = int, default = 100)
+    parser.add_argument('--checkpoint', type = int, default = 10)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = None)
+    args = parser.parse_args()
+
+    agent = agent_from_csv(load_model(args.model), args.csv)
+    if args.mode == 'worker':
+        Worker(agent, args.host or 'localhost', args.port).run()
+        return
+    coordinator = Coordinator(agent, args.seed, args.host or '0.0.0.0', args.port)
+    print('waiting for %d workers on %s:%d' % ((args.workers,) + coordinator.address[:2]))
+    try:
+        coordinator.accept(args.workers)
+        coordinator.train(args.epochs, print_every = args.checkpoint)
+    finally:
+        coordinator.close()
+    if args.output:
+        import pickle
+
+        agent.model.set_weights(agent.es.get_weights())
+        with open(args.output, 'wb') as fopen:
+            pickle.dump(agent.model, fopen)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+import os
+import time
+
+import numpy as np
+
+
+class NoiseTable:
+    """
+    one gaussian block drawn once, a member's noise is a contiguous slice of
+    it starting at some offset, reshaped into the weight shapes without copies
+
+    with path the block is saved there on first use and memory-mapped
+    read-only afterwards, so processes on one host share the same pages
+    """
+
+    def __init__(self, size = 10000000, seed = 0, path = None, dtype = np.float32):
+        if path is not None and os.path.exists(path):
+            self.noise = np.load(path, mmap_mode = 'r')
+            return
+        noise = np.random.RandomState(seed).randn(size).astype(dtype)
+        if path is None:
+            noise.flags.writeable = False
+            self.noise = noise
+            return
+        np.save(path, noise)
+        del noise
+        self.noise = np.load(path, mmap_mode = 'r')
+
+    def get(self, offset, shapes):
+        views = []
+        for shape in shapes:
+            size = int(np.prod(shape))
+            views.append(self.noise[offset : offset + size].reshape(shape))
+            offset += size
+        return views
+
+    def max_offset(self, shapes):
+        return len(self.noise) - sum(int(np.prod(shape)) for shape in shapes)
+
+
+def zscore_fitness(rewards):
+    return (rewards - np.mean(rewards)) / (np.std(rewards) + 1e-7)
+
+
+def centered_rank_fitness(rewards):
+    """
+    ranks scaled to [-0.5, 0.5], only the order of the rewards counts, so
+    one outlier episode can not dominate the update
+    """
+    ranks = np.empty(len(rewards))
+    ranks[np.argsort(rewards, kind = 'stable')] = np.arange(len(rewards))
+    if len(rewards) > 1:
+        ranks /= len(rewards) - 1
+    return ranks - 0.5
+
+
+class Momentum:
+    """
+    ascent with momentum on the ES gradient estimate, weight_decay pulls the
+    weights towards zero by learning_rate * weight_decay of themselves
+    """
+
+    def __init__(self, momentum = 0.9, weight_decay = 0.0):
+        self.momentum = momentum
+        self.weight_decay = weight_decay
+        self._velocity = None
+
+    def step(self, weights, gradients, learning_rate):
+        if self._velocity is None:
+            self._velocity = [np.zeros(w.shape) for w in weights]
+        updated = []
+        for w, g, v in zip(weights, gradients, self._velocity):
+            v *= self.momentum
+            v += g
+            updated.append(w + learning_rate * (v - self.weight_decay * w))
+        return updated
+
+
+class Adam:
+    """
+    Adam ascent on the ES gradient estimate, with decoupled weight decay
+    """
+
+    def __init__(self, beta1 = 0.9, beta2 = 0.999, epsilon = 1e-8, weight_decay = 0.0):
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.weight_decay = weight_decay
+        self._moments = None
+        self._t = 0
+
+    def step(self, weights, gradients, learning_rate):
+        if self._moments is None:
+            self._moments = [(np.zeros(w.shape), np.zeros(w.shape)) for w in weights]
+        self._t += 1
+        # bias corrections folded into the step size
+        step_size = (
+            learning_rate
+            * np.sqrt(1 - self.beta2 ** self._t)
+            / (1 - self.beta1 ** self._t)
+        )
+        updated = []
+        for w, g, (m, v) in zip(weights, gradients, self._moments):
+            m *= self.beta1
+            m += (1 - self.beta1) * g
+            v *= self.beta2
+            v += (1 - self.beta2) * g * g
+            updated.append(
+                w
+                + step_size * m / (np.sqrt(v) + self.epsilon)
+                - learning_rate * self.weight_decay * w
+            )
+        return updated
+
+
+class Deep_Evolution_Strategy:
+    """
+    the update rule is picked per run with three attributes:
+
+    - fitness: how rewards become member weights, zscore_fitness by default
+      or centered_rank_fitness
+    - mirrored: draw half the population and add each noise with both signs
+    - optimizer: None for plain gradient ascent at learning_rate, or an
+      object with step(weights, gradients, learning_rate), e.g. Momentum or
+      Adam, that keeps its own state across epochs
+    """
+
+    inputs = None
+
+    def __init__(
+        self,
+        weights,
+        reward_function,
+        population_size,
+        sigma,
+        learning_rate,
+        batch_reward_function = None,
+        seed = None,
+        noise_table = None,
+    ):
+        self.weights = weights
+        self.reward_function = reward_function
+        self.population_size = population_size
+        self.sigma = sigma
+        self.learning_rate = learning_rate
+        # takes the list of every member's weights and returns all rewards
+        # at once, when set it replaces the member by member evaluation
+        self.batch_reward_function = batch_reward_function
+        # NoiseTable to slice member noise from instead of calling randn
+        self.noise_table = noise_table
+        # called with no arguments before every epoch, e.g. to pick the
+        # episodes the whole population is scored on
+        self.before_epoch = None
+        self.fitness = zscore_fitness
+        self.mirrored = False
+        self.optimizer = None
+        self.set_seed(seed)
+
+    def set_seed(self, seed):
+        """
+        with a seed every member's noise is drawn from its own integer seed,
+        so a population can be rebuilt anywhere from seeds alone
+        """
+        self._seeds = None if seed is None else np.random.RandomState(seed)
+
+    def next_seeds(self):
+        return self._seeds.randint(0, 2 ** 31 - 1, size = self.population_size)
+
+    def next_members(self):
+        """
+        (seed, sign) of every member of the next population, a member's
+        noise is get_member_noise(seed, sign), see set_seed
+        """
+        seeds = self.next_seeds().tolist()
+        if not self.mirrored:
+            return [(seed, 1) for seed in seeds]
+        half = self.population_size - self.population_size // 2
+        members = []
+        for seed in seeds[:half]:
+            members += [(seed, 1), (seed, -1)]
+        return members[: self.population_size]
+
+    def get_member_noise(self, seed, sign):
+        noise = self.get_noise(seed)
+        if sign < 0:
+            return [-n for n in noise]
+        return noise
+
+    def get_noise(self, seed):
+        if self.noise_table is not None:
+            shapes = [w.shape for w in self.weights]
+            offset = seed % (self.noise_table.max_offset(shapes) + 1)
+            return self.noise_table.get(offset, shapes)
+        rng = np.random.RandomState(seed)
+        return [rng.randn(*w.shape) for w in self.weights]
+
+    def _get_weight_from_population(self, weights, population):
+        weights_population = []
+        for index, i in enumerate(population):
+            jittered = self.sigma * i
+            weights_population.append(weights[index] + jittered)
+        return weights_population
+
+    def get_weights(self):
+        return self.weights
+
+    def get_rewards(self, population):
+        weights_population = [
+            self._get_weight_from_population(self.weights, member)
+            for member in population
+        ]
+        if self.batch_reward_function is not None:
+            return np.asarray(
+                self.batch_reward_function(weights_population), dtype = np.float64
+            )
+        rewards = np.zeros(len(weights_population))
+        for k, weights in enumerate(weights_population):
+            rewards[k] = self.reward_function(weights)
+        return rewards
+
+    def sample_population(self):
+        if self._seeds is not None:
+            return [self.get_member_noise(*member) for member in self.next_members()]
+        if self.mirrored:
+            # antithetic pairs, the last member is unpaired for an odd size
+            half = self.population_size - self.population_size // 2
+            population = []
+            for member in self._sample(half):
+                population.append(member)
+                population.append([-noise for noise in member])
+            return population[: self.population_size]
+        return self._sample(self.population_size)
+
+    def _sample(self, population_size):
+        if self.noise_table is not None:
+            shapes = [w.shape for w in self.weights]
+            offsets = np.random.randint(
+                0, self.noise_table.max_offset(shapes) + 1, size = population_size
+            )
+            return [self.noise_table.get(offset, shapes) for offset in offsets]
+        population = []
+        for k in range(population_size):
+            x = []
+            for w in self.weights:
+                x.append(np.random.randn(*w.shape))
+            population.append(x)
+        return population
+
+    def _steps(self, population, rewards):
+        if self.noise_table is not None:
+            # members are views into the table, accumulate instead of
+            # stacking them into a population sized copy
+            for index, w in enumerate(self.weights):
+                step = np.zeros(w.shape)
+                scratch = np.empty(w.shape)
+                for p, reward in zip(population, rewards):
+                    step += np.multiply(p[index], reward, out = scratch)
+                yield step
+            return
+        for index, w in enumerate(self.weights):
+            A = np.array([p[index] for p in population])
+            yield np.dot(A.T, rewards).T
+
+    def update(self, population, rewards):
+        rewards = self.fitness(rewards)
+        steps = self._steps(population, rewards)
+        if self.optimizer is None:
+            for index, (w, step) in enumerate(zip(self.weights, steps)):
+                self.weights[index] = (
+                    w
+                    + self.learning_rate
+                    / (self.population_size * self.sigma)
+                    * step
+                )
+            return
+        gradients = [step / (self.population_size * self.sigma) for step in steps]
+        self.weights[:] = self.optimizer.step(
+            self.weights, gradients, self.learning_rate
+        )
+
+    def step(self):
+        """
+        one epoch: sample, score and update
+        """
+        if self.before_epoch is not None:
+            self.before_epoch()
+        population = self.sample_population()
+        rewards = self.get_rewards(population)
+        self.update(population, rewards)
+        return rewards
+
+    def train(self, epoch = 100, print_every = 1):
+        lasttime = time.time()
+        for i in range(epoch):
+            self.step()
+            if (i + 1) % print_every == 0:
+                print(
+                    'iter %d. reward: %f'
+                    % (i + 1, self.reward_function(self.weights))
+                )
+        print('time taken to train:', time.time() - lasttime, 'seconds')
@@ -0,0 +1,37 @@
+"""
+Production server: one worker process per core, forked from a master that
+has already loaded app.py.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+model.bin and data.bin are memory-mapped once by the master, so every worker
+shares their pages. Agent state goes through the sqlite store in the AGENT_STORE
+directory, one file per symbol, so a symbol stays correct whichever worker gets
+its requests and symbols never wait on each other. Rows saved over other data,
+say before a CSV changed, are not restored.
+
+/metrics is not shared: every worker counts its own requests, and a scrape
+gets the counters of whichever worker answers it. Series only stay continuous
+with WEB_CONCURRENCY=1.
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8005')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# agents lock per symbol, so threads in a worker only wait on the same symbol
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 4))
+preload_app = True
+
+os.environ.setdefault('AGENT_STORE', '/tmp/realtime-agent-state')
+# a long polling /state holds a thread, leave the other half for trading
+os.environ.setdefault('MAX_LONG_POLLS', str(max(threads // 2, 1)))
+
+
+def when_ready(server):
+    # keep what the master loaded out of the collector, a collection in a
+    # worker would otherwise write to, and so copy, the shared pages
+    gc.freeze()
@@ -0,0 +1,126 @@
+import logging
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+class Histogram:
+    """
+    prometheus style histogram, one series per label combination
+    """
+
+    def __init__(self, name, documentation, labelnames = (), buckets = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def render(self):
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s histogram' % self.name,
+        ]
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for labelvalues, (counts, total) in series:
+            labels = list(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(
+                    '%s_bucket%s %d'
+                    % (self.name, _format_labels(labels + [('le', _format_value(bound))]), cumulative)
+                )
+            lines.append('%s_sum%s %s' % (self.name, _format_labels(labels), _format_value(total)))
+            lines.append('%s_count%s %d' % (self.name, _format_labels(labels), cumulative))
+        return '\n'.join(lines)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, *self.labelvalues)
+
+
+class SampledLogger:
+    """
+    logs one call out of every, and only costs a level check when the
+    level is disabled, which it is by default
+    """
+
+    def __init__(self, logger, every = 100):
+        self.logger = logger
+        self.every = every
+        self._count = 0
+
+    def debug(self, msg, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._count
+        self._count = count + 1
+        if count % self.every == 0:
+            self.logger.debug(msg, *args)
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route.',
+    ('route', 'method', 'status'),
+)
+STAGE_SECONDS = Histogram(
+    'agent_stage_duration_seconds',
+    'Time spent per trading stage.',
+    ('stage',),
+)
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS]
+
+
+def stage(name):
+    return STAGE_SECONDS.time(name)
+
+
+def render():
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
@@ -0,0 +1,212 @@
+import pickle
+import threading
+
+import numpy as np
+
+
+def softmax(z):
+    assert len(z.shape) == 2
+    s = np.max(z, axis=1)
+    s = s[:, np.newaxis]
+    e_x = np.exp(z - s)
+    div = np.sum(e_x, axis=1)
+    div = div[:, np.newaxis]
+    return e_x / div
+
+
+class Model:
+    def __init__(self, input_size, layer_size, output_size):
+        self.weights = [
+            np.random.rand(input_size, layer_size)
+            * np.sqrt(1 / (input_size + layer_size)),
+            np.random.rand(layer_size, output_size)
+            * np.sqrt(1 / (layer_size + output_size)),
+            np.zeros((1, layer_size)),
+            np.zeros((1, output_size)),
+        ]
+
+    def predict(self, inputs):
+        feed = np.dot(inputs, self.weights[0]) + self.weights[-2]
+        decision = np.dot(feed, self.weights[1]) + self.weights[-1]
+        return decision
+
+    def predict_softmax(self, inputs):
+        """
+        (argmax, softmax) of the decision for every row of inputs
+        """
+        decision = self.predict(inputs)
+        return np.argmax(decision, axis = 1), softmax(decision)
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, weights):
+        self.weights = weights
+
+
+class InferenceModel:
+    """
+    serving only view of a Model, the weights held in float32 and every
+    intermediate written into buffers kept per thread, so a prediction
+    allocates nothing once a batch size has been seen
+
+    halves weight memory, and float32 weights are used in place, e.g. from a
+    model.bin written with --float32. Outputs are the reused buffers, valid
+    until the next call from the same thread
+    """
+
+    def __init__(self, model, dtype = np.float32):
+        self.dtype = np.dtype(dtype)
+        self.weights = [
+            np.ascontiguousarray(w, dtype = self.dtype) for w in model.get_weights()
+        ]
+        self._local = threading.local()
+
+    def _buffers(self, n):
+        local = self._local
+        views = getattr(local, 'views', None)
+        if views is not None and views[0].shape[0] == n:
+            return views
+        buffers = getattr(local, 'buffers', None)
+        if buffers is None or buffers[0].shape[0] < n:
+            input_size, layer_size = self.weights[0].shape
+            output_size = self.weights[1].shape[1]
+            buffers = local.buffers = (
+                np.empty((n, input_size), dtype = self.dtype),
+                np.empty((n, layer_size), dtype = self.dtype),
+                np.empty((n, output_size), dtype = self.dtype),
+                np.empty((n, 1), dtype = self.dtype),
+            )
+        views = local.views = tuple(buffer[:n] for buffer in buffers)
+        return views
+
+    def predict(self, inputs):
+        inputs = np.asarray(inputs)
+        x, feed, decision, _ = self._buffers(inputs.shape[0])
+        np.copyto(x, inputs, casting = 'same_kind')
+        np.dot(x, self.weights[0], out = feed)
+        feed += self.weights[-2]
+        np.dot(feed, self.weights[1], out = decision)
+        decision += self.weights[-1]
+        return decision
+
+    def predict_softmax(self, inputs):
+        """
+        (argmax, softmax) of the decision for every row of inputs, the
+        softmax computed in place over the decision
+        """
+        decision = self.predict(inputs)
+        reduced = self._buffers(decision.shape[0])[3]
+        actions = decision.argmax(1)
+        # ufunc reductions, np.max and np.sum cost twice as much on tiny rows
+        np.maximum.reduce(decision, axis = 1, keepdims = True, out = reduced)
+        decision -= reduced
+        np.exp(decision, out = decision)
+        np.add.reduce(decision, axis = 1, keepdims = True, out = reduced)
+        decision /= reduced
+        return actions, decision
+
+    def get_weights(self):
+        return self.weights
+
+
+# float32 copies of int8 weights, one per shape and thread, shared by every
+# QuantizedModel
+_scratch = threading.local()
+
+
+def _scratch_buffer(shape):
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(shape)
+    if buffer is None:
+        buffer = buffers[shape] = np.empty(shape, dtype = np.float32)
+    return buffer
+
+
+class QuantizedModel(InferenceModel):
+    """
+    serving only model with weights[0] and weights[1] stored as int8 and a
+    float32 scale per column, w = q * scale, a quarter of the float32 memory
+
+    each predict widens the int8 weights into a scratch buffer shared by all
+    quantized models on the thread and applies the scales to the layer
+    outputs, so per model memory stays int8
+    """
+
+    def __init__(self, weights, scales):
+        self.dtype = np.dtype(np.float32)
+        self.weights = [
+            np.asarray(weights[0], dtype = np.int8),
+            np.asarray(weights[1], dtype = np.int8),
+            np.asarray(weights[2], dtype = np.float32),
+            np.asarray(weights[3], dtype = np.float32),
+        ]
+        self.scales = [np.asarray(scale, dtype = np.float32) for scale in scales]
+        self._local = threading.local()
+
+    @classmethod
+    def quantize(cls, model):
+        """
+        symmetric per column int8 quantization of a float model
+        """
+        weights = model.get_weights()
+        quantized, scales = [], []
+        for w in weights[:2]:
+            w = np.asarray(w, dtype = np.float64)
+            scale = np.abs(w).max(axis = 0, keepdims = True) / 127
+            scale[scale == 0] = 1.0
+            quantized.append(np.clip(np.rint(w / scale), -127, 127).astype(np.int8))
+            scales.append(scale.astype(np.float32))
+        return cls(quantized + list(weights[2:]), scales)
+
+    def dequantized_weights(self):
+        return [
+            self.weights[0] * self.scales[0],
+            self.weights[1] * self.scales[1],
+            self.weights[2],
+            self.weights[3],
+        ]
+
+    def _dense(self, x, layer, out):
+        weights = self.weights[layer]
+        scratch = _scratch_buffer(weights.shape)
+        np.copyto(scratch, weights)
+        np.dot(x, scratch, out = out)
+        out *= self.scales[layer]
+        out += self.weights[layer + 2]
+
+    def predict(self, inputs):
+        inputs = np.asarray(inputs)
+        x, feed, decision, _ = self._buffers(inputs.shape[0])
+        np.copyto(x, inputs, casting = 'same_kind')
+        self._dense(x, 0, feed)
+        self._dense(feed, 1, decision)
+        return decision
+
+
+class _ModelUnpickler(pickle.Unpickler):
+    # model.pkl was pickled from a notebook, so Model is recorded as __main__.Model
+    def find_class(self, module, name):
+        if name == 'Model' and module in ('__main__', __name__):
+            return Model
+        return super().find_class(module, name)
+
+
+def load_model(path, inference_dtype = None):
+    """
+    load a model.bin written by modelfile.py or a pickled model.pkl, with
+    inference_dtype, e.g. 'float32', as an InferenceModel for serving
+    """
+    if path.endswith('.bin'):
+        from modelfile import load_model_file
+
+        model = load_model_file(path)
+    else:
+        with open(path, 'rb') as fopen:
+            model = _ModelUnpickler(fopen).load()
+    # a quantized model is already a serving model
+    if inference_dtype and not isinstance(model, InferenceModel):
+        model = InferenceModel(model, inference_dtype)
+    return model
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Compact binary model format.
+
+A file is a small fixed header, a JSON table of contents and the raw arrays,
+each one contiguous and 64-byte aligned. Loading memory-maps the file
+read-only and wraps the arrays in place, so it costs no parsing or copying
+and every process that loads the same file shares the same pages. Each
+array and the table of contents carry a CRC32.
+
+    python modelfile.py model.pkl model.bin
+"""
+
+import json
+import mmap
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'RTAM'
+VERSION = 1
+ALIGNMENT = 64
+# magic, version, reserved, toc length, toc crc32
+_HEADER = struct.Struct('<4sHHII')
+
+WEIGHT_NAMES = ['weights.0', 'weights.1', 'weights.2', 'weights.3']
+# per column scales of the int8 weights of a quantized model
+SCALE_NAMES = ['scales.0', 'scales.1']
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_arrays(path, arrays, metadata = None):
+    """
+    write a dict of name -> array
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = []
+    # the table of contents holds the offsets, so size it with placeholders
+    # first and lay the data out after it
+    for name, array in arrays.items():
+        entries.append(
+            {
+                'name': name,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': 0,
+                'nbytes': array.nbytes,
+                'crc32': zlib.crc32(array.tobytes()),
+            }
+        )
+    toc = {'arrays': entries, 'metadata': metadata or {}}
+    while True:
+        encoded = json.dumps(toc, sort_keys = True).encode()
+        offset = _align(_HEADER.size + len(encoded))
+        changed = False
+        for entry in entries:
+            if entry['offset'] != offset:
+                entry['offset'] = offset
+                changed = True
+            offset = _align(offset + entry['nbytes'])
+        if not changed:
+            break
+    with open(path, 'wb') as fopen:
+        fopen.write(_HEADER.pack(MAGIC, VERSION, 0, len(encoded), zlib.crc32(encoded)))
+        fopen.write(encoded)
+        for entry, array in zip(entries, arrays.values()):
+            fopen.write(b'\0' * (entry['offset'] - fopen.tell()))
+            fopen.write(array.tobytes())
+
+
+def load_arrays(path, verify = True):
+    """
+    memory-map a file written by save_arrays, returns (arrays, metadata)
+    with read-only arrays backed by the mapping
+    """
+    with open(path, 'rb') as fopen:
+        buffer = mmap.mmap(fopen.fileno(), 0, access = mmap.ACCESS_READ)
+    magic, version, _, toc_length, toc_crc = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('%s is not a model file' % path)
+    if version > VERSION:
+        raise ValueError('%s has unsupported version %d' % (path, version))
+    encoded = buffer[_HEADER.size : _HEADER.size + toc_length]
+    if zlib.crc32(encoded) != toc_crc:
+        raise ValueError('%s has a corrupt table of contents' % path)
+    toc = json.loads(encoded)
+    arrays = {}
+    for entry in toc['arrays']:
+        dtype = np.dtype(entry['dtype'])
+        array = np.frombuffer(
+            buffer,
+            dtype = dtype,
+            count = entry['nbytes'] // dtype.itemsize,
+            offset = entry['offset'],
+        ).reshape(entry['shape'])
+        if verify and zlib.crc32(array) != entry['crc32']:
+            raise ValueError('%s: checksum mismatch for %s' % (path, entry['name']))
+        arrays[entry['name']] = array
+    return arrays, toc['metadata']
+
+
+def save_model(path, model, dtype = np.float64):
+    weights = model.get_weights()
+    save_arrays(
+        path,
+        {name: np.asarray(w, dtype = dtype) for name, w in zip(WEIGHT_NAMES, weights)},
+        {'kind': 'model'},
+    )
+
+
+def save_quantized_model(path, model):
+    """
+    write a QuantizedModel, loaded back by load_model_file
+    """
+    arrays = dict(zip(WEIGHT_NAMES, model.weights))
+    arrays.update(zip(SCALE_NAMES, model.scales))
+    save_arrays(path, arrays, {'kind': 'quantized'})
+
+
+def load_model_file(path, verify = True):
+    from model import Model, QuantizedModel
+
+    arrays, metadata = load_arrays(path, verify = verify)
+    weights = [arrays[name] for name in WEIGHT_NAMES]
+    if metadata.get('kind') == 'quantized':
+        return QuantizedModel(weights, [arrays[name] for name in SCALE_NAMES])
+    model = Model.__new__(Model)
+    model.set_weights(weights)
+    return model
+
+
+def main():
+    import argparse
+
+    from model import load_model
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('source', help = 'pickled model, e.g. model.pkl')
+    parser.add_argument('target', help = 'output file, e.g. model.bin')
+    parser.add_argument(
+        '--float32', action = 'store_true', help = 'store weights as float32'
+    )
+    args = parser.parse_args()
+
+    model = load_model(args.source)
+    save_model(args.target, model, np.float32 if args.float32 else np.float64)
+    loaded = load_model_file(args.target)
+    print(
+        'wrote %s: %s'
+        % (args.target, ', '.join('x'.join(map(str, w.shape)) for w in loaded.get_weights()))
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from agent import population_reward, window_size
+from state import get_states
+
+# per worker process, filled in by _attach
+_worker = {}
+
+
+def _attach(name, shape, dtype, skip, scaled_capital, mean, std):
+    block = shared_memory.SharedMemory(name = name)
+    parameters = np.ndarray(shape, dtype = dtype, buffer = block.buf)
+    parameters.flags.writeable = False
+    _worker['block'] = block
+    windows = get_states(parameters, window_size = window_size)
+    _worker['args'] = (parameters, skip, scaled_capital, mean, std, windows)
+
+
+def _evaluate(task):
+    weights_population, episodes = task
+    return population_reward(weights_population, *_worker['args'], episodes = episodes)
+
+
+class RewardPool:
+    """
+    population_reward fanned out to worker processes, the scaled price
+    block (close row is the trend) lives in shared memory and every worker
+    maps it once instead of receiving a pickled copy each epoch
+
+    instances are a drop-in batch_reward_function for Deep_Evolution_Strategy
+    """
+
+    def __init__(self, agent, workers = None):
+        self.workers = workers or mp.cpu_count()
+        # every chunk is scored on the agent's episodes of the epoch
+        self.agent = agent
+        parameters = agent._parameters
+        self._block = shared_memory.SharedMemory(
+            create = True, size = max(parameters.nbytes, 1)
+        )
+        shared = np.ndarray(
+            parameters.shape, dtype = parameters.dtype, buffer = self._block.buf
+        )
+        shared[:] = parameters
+        self._pool = mp.Pool(
+            self.workers,
+            initializer = _attach,
+            initargs = (
+                self._block.name,
+                parameters.shape,
+                parameters.dtype.str,
+                agent.skip,
+                agent._scaled_capital,
+                agent._mean,
+                agent._std,
+            ),
+        )
+
+    def __call__(self, weights_population):
+        # contiguous chunks, one per worker, each scored as a batch
+        chunks = [
+            chunk.tolist()
+            for chunk in np.array_split(
+                np.arange(len(weights_population)), self.workers
+            )
+            if len(chunk)
+        ]
+        results = self._pool.map(
+            _evaluate,
+            [
+                ([weights_population[k] for k in chunk], self.agent.episodes)
+                for chunk in chunks
+            ],
+        )
+        return np.concatenate(results)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._block.close()
+        self._block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
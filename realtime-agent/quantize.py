@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Post-training int8 quantization.
+
+Writes weights[0] and weights[1] of a model as int8 with a float32 scale per
+column, see QuantizedModel, and reports how often the quantized model takes
+the full precision action on every CSV next to the model:
+
+- same state: both models decide on the states the full precision agent saw
+  while replaying the CSV
+- replay: the quantized agent replays the CSV on its own, so one different
+  action changes every state after it
+
+    python quantize.py model.bin model_int8.bin
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+
+from agent import agent_from_csv
+from dataset import read_columns
+from model import QuantizedModel, load_model
+from modelfile import save_quantized_model
+
+
+class _StateRecorder:
+    """
+    keeps every state a model is asked to decide on
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.states = []
+
+    def predict_softmax(self, inputs):
+        self.states.append(np.array(inputs))
+        return self.model.predict_softmax(inputs)
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+
+def replay(model, path):
+    agent = agent_from_csv(model, path)
+    return [agent.trade(list(tick))['action'] for tick in zip(*read_columns(path))]
+
+
+def agreement(model, quantized, path):
+    """
+    (same state agreement, replay agreement, number of decisions) on a CSV
+    """
+    recorder = _StateRecorder(model)
+    expected = replay(recorder, path)
+    if not recorder.states:
+        return 1.0, 1.0, 0
+    states = np.concatenate(recorder.states)
+    same_state = np.mean(
+        model.predict_softmax(states)[0] == quantized.predict_softmax(states)[0]
+    )
+    actions = replay(quantized, path)
+    decided = [i for i, action in enumerate(expected) if action != 'fail']
+    same_replay = np.mean([expected[i] == actions[i] for i in decided])
+    return float(same_state), float(same_replay), len(decided)
+
+
+def nbytes(model):
+    return sum(w.nbytes for w in model.get_weights()) + sum(
+        scale.nbytes for scale in getattr(model, 'scales', [])
+    )
+
+
+def main():
+    import argparse
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('source', help = 'full precision model, e.g. model.bin')
+    parser.add_argument('target', help = 'output file, e.g. model_int8.bin')
+    parser.add_argument('--data-dir', default = script_dir, help = 'directory of the CSVs')
+    args = parser.parse_args()
+
+    model = load_model(args.source)
+    quantized = QuantizedModel.quantize(model)
+    save_quantized_model(args.target, quantized)
+    quantized = load_model(args.target)
+    print(
+        'wrote %s: %d bytes of weights, %d before'
+        % (args.target, nbytes(quantized), nbytes(model))
+    )
+
+    print('%-10s %10s %10s %10s' % ('csv', 'decisions', 'same state', 'replay'))
+    total_same, total_replay, total = 0.0, 0.0, 0
+    for path in sorted(glob.glob(os.path.join(args.data_dir, '*.csv'))):
+        same_state, same_replay, decisions = agreement(model, quantized, path)
+        total_same += same_state * decisions
+        total_replay += same_replay * decisions
+        total += decisions
+        print(
+            '%-10s %10d %9.2f%% %9.2f%%'
+            % (os.path.basename(path)[:-4], decisions, same_state * 100, same_replay * 100)
+        )
+    if total:
+        print(
+            '%-10s %10d %9.2f%% %9.2f%%'
+            % ('all', total, total_same / total * 100, total_replay / total * 100)
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from agent import agent_from_csv, agent_from_parameters, window_size
+from dataset import Dataset
+from model import load_model
+from modelfile import load_arrays, save_arrays
+
+_SYMBOL = re.compile(r'^[A-Z0-9][A-Z0-9.\-]{0,15}$')
+
+
+class UnknownSymbol(KeyError):
+    pass
+
+
+def agent_nbytes(agent, shared_model = None):
+    """
+    rough resident size of an agent, weights shared with other agents are
+    not counted
+
+    the window features, Agent.windows, are counted whether or not they are
+    built yet. They are the largest array and come with the first reward or
+    backtest, long after the registry measured the agent
+    """
+    n_parameters, length = agent._parameters.shape
+    windows = length * n_parameters * 2 * (window_size - 1) * np.dtype(np.float64).itemsize
+    size = agent._parameters.nbytes + agent._stream._buffer.nbytes + windows
+    # real_trend is a view, it keeps the whole block it came from alive
+    # unless that is the data.bin mapping
+    block = agent.real_trend
+    while isinstance(block.base, np.ndarray):
+        block = block.base
+    if block.base is None:
+        size += block.nbytes
+    if agent.model is not shared_model:
+        size += sum(w.nbytes for w in agent.model.get_weights())
+    return size
+
+
+class AgentRegistry:
+    """
+    one agent per symbol, built on first use from <data_dir>/<SYMBOL>.csv and
+    kept in an LRU bounded by count and by estimated memory
+
+    a symbol trades with model_<SYMBOL>.bin or model_<SYMBOL>.pkl when one
+    exists, otherwise it shares the default model read-only. data.bin, see
+    dataset.py, stands in for CSVs it was built from
+
+    per symbol models are loaded as InferenceModel with inference_dtype set
+
+    with snapshot_path set, the trading state of every agent is saved there
+    by save_snapshot and picked up again by a later process. With a
+    state_store, see store.py, every change goes through the store, which
+    keeps agents for one symbol in several worker processes in step
+    """
+
+    def __init__(
+        self,
+        model,
+        data_dir,
+        skip = 1,
+        max_agents = 256,
+        max_bytes = 512 * 2 ** 20,
+        snapshot_path = None,
+        inference_dtype = None,
+        state_store = None,
+    ):
+        self.model = model
+        self.data_dir = data_dir
+        self.skip = skip
+        self.max_agents = max_agents
+        self.max_bytes = max_bytes
+        self.snapshot_path = snapshot_path
+        self.inference_dtype = inference_dtype
+        self.state_store = state_store
+        self._agents = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.dataset = None
+        dataset_path = os.path.join(data_dir, 'data.bin')
+        if os.path.exists(dataset_path):
+            try:
+                self.dataset = Dataset(dataset_path)
+            except ValueError as e:
+                print('Ignoring %s: %s' % (dataset_path, e))
+        # symbol -> (arrays, values) not yet handed to an agent
+        self._pending = self._read_snapshot()
+
+    def _path(self, symbol, template):
+        return os.path.join(self.data_dir, template % symbol)
+
+    def normalize(self, symbol):
+        symbol = str(symbol).upper()
+        if not _SYMBOL.match(symbol) or not os.path.exists(self._path(symbol, '%s.csv')):
+            raise UnknownSymbol(symbol)
+        return symbol
+
+    def symbols(self):
+        return sorted(
+            name[:-4].upper()
+            for name in os.listdir(self.data_dir)
+            if name.lower().endswith('.csv') and _SYMBOL.match(name[:-4].upper())
+        )
+
+    def loaded(self):
+        with self._lock:
+            return list(self._agents)
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def _load(self, symbol):
+        model = self.model
+        for template in ('model_%s.bin', 'model_%s.pkl'):
+            model_path = self._path(symbol, template)
+            if os.path.exists(model_path):
+                model = load_model(model_path, self.inference_dtype)
+                break
+        csv_path = self._path(symbol, '%s.csv')
+        entry = self.dataset.get(symbol, csv_path) if self.dataset else None
+        if entry is None:
+            return agent_from_csv(model, csv_path, self.skip)
+        parameters, scaler = entry
+        return agent_from_parameters(model, parameters, scaler, self.skip)
+
+    def get(self, symbol):
+        symbol = self.normalize(symbol)
+        with self._lock:
+            agent = self._agents.get(symbol)
+            if agent is not None:
+                self._agents.move_to_end(symbol)
+                return agent
+            agent = self._load(symbol)
+            agent.symbol = symbol
+            agent.state_store = self.state_store
+            if symbol in self._pending:
+                try:
+                    agent.restore(*self._pending.pop(symbol))
+                except (KeyError, ValueError) as e:
+                    print('Ignoring snapshot of %s: %s' % (symbol, e))
+            self._agents[symbol] = agent
+            self._sizes[symbol] = agent_nbytes(agent, self.model)
+            self._evict()
+            return agent
+
+    def _evict(self):
+        # never evict the agent that was just loaded
+        while len(self._agents) > 1 and (
+            len(self._agents) > self.max_agents or self.nbytes > self.max_bytes
+        ):
+            symbol, agent = self._agents.popitem(last = False)
+            del self._sizes[symbol]
+            if self.snapshot_path:
+                self._pending[symbol] = agent.snapshot()
+
+    def _read_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return {}
+        try:
+            arrays, metadata = load_arrays(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            print('Ignoring snapshot %s: %s' % (self.snapshot_path, e))
+            return {}
+        return {
+            symbol: (
+                {
+                    name: np.array(arrays['%s/%s' % (symbol, name)])
+                    for name in ('buffer', 'inventory')
+                },
+                values,
+            )
+            for symbol, values in metadata.get('agents', {}).items()
+        }
+
+    def save_snapshot(self):
+        """
+        write the state of every agent to snapshot_path, a no-op without one
+        """
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            states = dict(self._pending)
+            for symbol, agent in self._agents.items():
+                states[symbol] = agent.snapshot()
+            arrays = {}
+            for symbol, (state_arrays, values) in states.items():
+                for name, array in state_arrays.items():
+                    arrays['%s/%s' % (symbol, name)] = array
+            # write then rename, so a reader never sees a partial file
+            tmp_path = '%s.%d.tmp' % (self.snapshot_path, os.getpid())
+            save_arrays(
+                tmp_path,
+                arrays,
+                {'kind': 'snapshot', 'agents': {symbol: values for symbol, (_, values) in states.items()}},
+            )
+            os.replace(tmp_path, self.snapshot_path)
@@ -0,0 +1,425 @@
+import json
+import math
+import threading
+from numbers import Real
+from time import perf_counter
+
+from flask import Blueprint, Response, current_app, g, jsonify, request
+from werkzeug.http import parse_etags, quote_etag
+
+import metrics
+from backtest import BacktestCache
+from metrics import REQUEST_SECONDS, stage
+from registry import UnknownSymbol
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+api = Blueprint('api', __name__)
+
+# upper bound on ticks accepted by one /trade/batch request
+MAX_BATCH_TICKS = 100000
+# upper bound on one line of a /trade/stream body or one /trade/ws message
+MAX_STREAM_LINE = 4096
+# upper bound on ticks received but not yet decided on one /trade/ws connection
+MAX_PENDING_TICKS = 1000
+# upper bound on how long /state holds a request open waiting for a change
+MAX_STATE_WAIT = 25.0
+# seconds a /state client that could not wait is asked to come back after
+STATE_RETRY_AFTER = 2
+
+
+def get_agent(symbol = None):
+    """
+    the agent serving symbol, by default the symbol query parameter and then
+    the app's default symbol, raises UnknownSymbol
+    """
+    if not symbol:
+        symbol = request.args.get('symbol') or current_app.config['SYMBOL']
+    return current_app.config['AGENTS'].get(symbol)
+
+
+@api.before_app_request
+def start_timer():
+    g.request_start = perf_counter()
+
+
+@api.after_app_request
+def record_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(
+            perf_counter() - start,
+            request.url_rule.rule if request.url_rule else 'unmatched',
+            request.method,
+            str(response.status_code),
+        )
+    return response
+
+
+# endpoints that change agent state, see AgentRegistry.save_snapshot
+STATEFUL_ENDPOINTS = {'api.trade', 'api.trade_batch', 'api.reset'}
+
+
+@api.after_app_request
+def save_snapshot(response):
+    if request.endpoint in STATEFUL_ENDPOINTS and response.status_code == 200:
+        current_app.config['AGENTS'].save_snapshot()
+    return response
+
+
+@api.route('/metrics', methods = ['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype = 'text/plain; version=0.0.4')
+
+
+@api.errorhandler(UnknownSymbol)
+def unknown_symbol(e):
+    return jsonify({'error': 'unknown symbol %s' % e.args[0]}), 404
+
+
+@api.route('/symbols', methods = ['GET'])
+def symbols():
+    registry = current_app.config['AGENTS']
+    return jsonify({'symbols': registry.symbols(), 'loaded': registry.loaded()})
+
+
+def is_tick(data):
+    # NaN and Infinity parse from JSON, they would poison the window and balance
+    return (
+        isinstance(data, list)
+        and len(data) == 2
+        and all(
+            isinstance(value, Real) and not isinstance(value, bool) and math.isfinite(value)
+            for value in data
+        )
+    )
+
+
+@api.route('/inventory', methods = ['GET'])
+def inventory():
+    agent = get_agent()
+    try:
+        return jsonify(agent.view().inventory)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/queue', methods = ['GET'])
+def queue():
+    agent = get_agent()
+    try:
+        return jsonify(agent.view().queue)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/balance', methods = ['GET'])
+def balance():
+    agent = get_agent()
+    try:
+        return jsonify(agent.view().balance)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def state_body(agent, view):
+    prices = [agent.scaler.inverse_value(price) for price in view.inventory]
+    return {
+        'version': view.version,
+        'balance': view.balance,
+        'inventory': {
+            'count': len(prices),
+            'cost': sum(prices),
+            'average_price': sum(prices) / len(prices) if prices else None,
+        },
+        'queue': len(view.queue),
+        'last_decision': view.last_decision,
+    }
+
+
+def long_poll_slots():
+    # long polls hold a request thread each, MAX_LONG_POLLS keeps some free
+    # for trading, 0 turns waiting off
+    extensions = current_app.extensions
+    if 'long_polls' not in extensions:
+        extensions.setdefault(
+            'long_polls',
+            threading.BoundedSemaphore(current_app.config.get('MAX_LONG_POLLS', 16)),
+        )
+    return extensions['long_polls']
+
+
+@api.route('/state', methods = ['GET'])
+def state():
+    """
+    balance, inventory summary, queue length and last decision in one
+    response, with the agent's state version as its ETag
+
+    with If-None-Match set to the current version the answer is 304, after
+    waiting up to ?wait=seconds for the agent to change. A request that
+    cannot get a long poll slot is answered at once with Retry-After
+    """
+    agent = get_agent()
+    wait = request.args.get('wait', 0.0, type = float)
+    if not math.isfinite(wait):
+        return jsonify({'error': 'wait must be a finite number of seconds'}), 400
+    wait = min(max(wait, 0.0), MAX_STATE_WAIT)
+    view = agent.view()
+    etag = '%s-%d' % (agent.epoch, view.version)
+    headers = {'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None and parse_etags(if_none_match).contains(etag):
+        if wait:
+            slots = long_poll_slots()
+            if slots.acquire(blocking = False):
+                try:
+                    view = agent.wait(view.version, wait)
+                finally:
+                    slots.release()
+                etag = '%s-%d' % (agent.epoch, view.version)
+            else:
+                headers['Retry-After'] = str(STATE_RETRY_AFTER)
+        if parse_etags(if_none_match).contains(etag):
+            headers['ETag'] = quote_etag(etag)
+            return Response(status = 304, headers = headers)
+    response = jsonify(state_body(agent, view))
+    response.headers.extend(headers)
+    response.set_etag(etag)
+    return response
+
+
+def backtest_cache():
+    extensions = current_app.extensions
+    if 'backtests' not in extensions:
+        extensions.setdefault(
+            'backtests', BacktestCache(current_app.config.get('BACKTEST_CACHE_SIZE', 128))
+        )
+    return extensions['backtests']
+
+
+@api.route('/backtest', methods = ['GET'])
+def backtest():
+    """
+    replay the symbol's whole CSV with the current model from ?money=,
+    by default the agent's initial money, see Agent.backtest. The live
+    trading state is not touched
+    """
+    agent = get_agent()
+    money = request.args.get('money')
+    try:
+        money = float(money) if money else None
+    except ValueError:
+        return jsonify({'error': 'money must be a valid number'}), 400
+    if money is not None and not (math.isfinite(money) and money > 0):
+        return jsonify({'error': 'money must be a positive finite number'}), 400
+    cache = backtest_cache()
+    key = cache.key(agent, money)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None and parse_etags(if_none_match).contains(key):
+        return Response(status = 304, headers = {'ETag': quote_etag(key)})
+    result = cache.get(agent, money, key = key)
+    with stage('serialize'):
+        response = jsonify(dict(result, symbol = agent.symbol))
+    response.set_etag(key)
+    return response
+
+
+@api.route('/trade', methods = ['GET'])
+def trade():
+    agent = get_agent()
+    try:
+        data_str = request.args.get('data')
+        if not data_str:
+            return jsonify({'error': 'data parameter is required'}), 400
+        try:
+            data = json.loads(data_str)
+        except json.JSONDecodeError:
+            return jsonify({'error': 'Invalid JSON format'}), 400
+
+        if not isinstance(data, list) or len(data) != 2:
+            return jsonify({'error': 'data must be a list with 2 elements [close_price, volume]'}), 400
+        if any(isinstance(value, float) and not math.isfinite(value) for value in data):
+            return jsonify({'error': 'close_price and volume must be finite'}), 400
+
+        result = agent.trade(data)
+        with stage('serialize'):
+            return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/trade/batch', methods = ['POST'])
+def trade_batch():
+    """
+    {"ticks": [[close, volume], ...], "symbol": optional} runs the ticks in
+    order through one agent, {"symbols": {"TWTR": [[close, volume], ...]}}
+    does the same for every listed symbol
+
+    every symbol and tick is checked before the first one is traded, so a
+    rejected request changes nothing
+    """
+    try:
+        body = request.get_json(silent = True)
+        if not isinstance(body, dict):
+            return jsonify({'error': 'JSON object body is required'}), 400
+        if 'symbols' in body:
+            batches = body['symbols']
+            if not isinstance(batches, dict):
+                return jsonify({'error': 'symbols must map symbol to a list of ticks'}), 400
+        elif 'ticks' in body:
+            batches = {body.get('symbol'): body['ticks']}
+        else:
+            return jsonify({'error': 'ticks or symbols is required'}), 400
+
+        agents = {}
+        total = 0
+        for symbol, ticks in batches.items():
+            if not isinstance(ticks, list) or not all(is_tick(tick) for tick in ticks):
+                return jsonify({'error': 'ticks must be a list of [close_price, volume]'}), 400
+            total += len(ticks)
+            agents[symbol] = get_agent(symbol)
+        if total > MAX_BATCH_TICKS:
+            return jsonify({'error': 'at most %d ticks per request' % MAX_BATCH_TICKS}), 413
+
+        results = {
+            symbol: agents[symbol].trade_batch(ticks) for symbol, ticks in batches.items()
+        }
+        with stage('serialize'):
+            if 'symbols' in body:
+                return jsonify({'results': results})
+            return jsonify(next(iter(results.values())))
+    except UnknownSymbol:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def stream_tick(registry, default, data):
+    """
+    decision for one streamed tick, data is [close, volume] for the default
+    symbol or {"symbol": "AMD", "tick": [close, volume]}, an error otherwise
+    """
+    symbol = default
+    if isinstance(data, dict):
+        symbol = data.get('symbol') or default
+        data = data.get('tick')
+    if not is_tick(data):
+        return {'error': 'tick must be [close_price, volume]'}
+    try:
+        agent = registry.get(symbol)
+    except UnknownSymbol:
+        return {'error': 'unknown symbol %s' % symbol}
+    result = agent.trade(data)
+    result['symbol'] = agent.symbol or symbol
+    return result
+
+
+@api.route('/trade/stream', methods = ['POST'])
+def trade_stream():
+    """
+    newline delimited JSON both ways: every line of the body is a tick, see
+    stream_tick, answered by one line as soon as it is decided, in the order
+    the ticks came in
+
+    a tick is only read once the previous decision has been written, so a
+    client that stops reading decisions stops the server reading ticks and
+    nothing queues up in between
+    """
+    registry = current_app.config['AGENTS']
+    default = request.args.get('symbol') or current_app.config['SYMBOL']
+    # unknown symbols fail here with a 404, before the stream starts
+    registry.get(default)
+    stream = request.stream
+    json_provider = current_app.json
+
+    def decisions():
+        try:
+            number = 0
+            while True:
+                line = stream.readline(MAX_STREAM_LINE + 1)
+                if not line:
+                    break
+                number += 1
+                if len(line) > MAX_STREAM_LINE:
+                    result = {'error': 'lines are limited to %d bytes' % MAX_STREAM_LINE}
+                elif not line.strip():
+                    continue
+                else:
+                    try:
+                        result = stream_tick(registry, default, json.loads(line))
+                    except ValueError:
+                        result = {'error': 'Invalid JSON format'}
+                if 'error' in result:
+                    result['line'] = number
+                with stage('serialize'):
+                    yield (json_provider.dumps(result) + '\n').encode()
+                if len(line) > MAX_STREAM_LINE:
+                    break
+        finally:
+            registry.save_snapshot()
+
+    return Response(
+        decisions(),
+        mimetype = 'application/x-ndjson',
+        # ask proxies to pass every line on at once
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+if Sock is not None:
+
+    @api.record_once
+    def limit_ws_messages(state):
+        # flask-sock reads its server options from the app config, larger
+        # messages close the connection with 1009 instead of being buffered
+        options = state.app.config.setdefault('SOCK_SERVER_OPTIONS', {})
+        options.setdefault('max_message_size', MAX_STREAM_LINE)
+
+    @Sock().route('/trade/ws', bp = api)
+    def trade_ws(ws):
+        """
+        one JSON tick per message, see stream_tick, answered by one message
+
+        ticks are decided in order as they arrive, a client more than
+        MAX_PENDING_TICKS ticks ahead of the decisions is disconnected with
+        1013 try again later, so a connection never holds more than about
+        that many messages of at most MAX_STREAM_LINE bytes
+        """
+        registry = current_app.config['AGENTS']
+        default = request.args.get('symbol') or current_app.config['SYMBOL']
+        json_provider = current_app.json
+        try:
+            while True:
+                message = ws.receive()
+                if len(ws.input_buffer) > MAX_PENDING_TICKS:
+                    ws.close(1013, 'more than %d ticks pending' % MAX_PENDING_TICKS)
+                    break
+                try:
+                    result = stream_tick(registry, default, json.loads(message))
+                except ValueError:
+                    result = {'error': 'Invalid JSON format'}
+                with stage('serialize'):
+                    ws.send(json_provider.dumps(result))
+        finally:
+            registry.save_snapshot()
+
+
+@api.route('/reset', methods = ['GET'])
+def reset():
+    agent = get_agent()
+    try:
+        money_str = request.args.get('money')
+        if not money_str:
+            return jsonify({'error': 'money parameter is required'}), 400
+        try:
+            money = float(money_str)
+        except ValueError:
+            return jsonify({'error': 'money must be a valid number'}), 400
+
+        agent.reset_capital(money)
+        return jsonify({'success': True, 'message': 'Agent reset successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class AffineScaler:
+    """
+    a fitted min-max normalization reduced to x * scale + offset per column
+
+    built from a fitted sklearn MinMaxScaler, or fitted directly with fit, it
+    applies the same operations in the same order, so results are
+    bit-identical, without sklearn's input validation on every call
+    """
+
+    def __init__(self, scale, offset):
+        self.scale_ = np.array(scale, dtype = np.float64)
+        self.min_ = np.array(offset, dtype = np.float64)
+        # python floats for the scalar paths
+        self._scale = self.scale_.tolist()
+        self._offset = self.min_.tolist()
+
+    @classmethod
+    def from_minmax(cls, minmax):
+        return cls(minmax.scale_, minmax.min_)
+
+    @classmethod
+    def fit(cls, X, feature_range = (0, 1)):
+        """
+        fit on X the way MinMaxScaler(feature_range).fit(X) does, to the bit
+        """
+        X = np.asarray(X, dtype = np.float64)
+        low = np.float64(feature_range[0])
+        high = np.float64(feature_range[1])
+        data_min = np.nanmin(X, axis = 0)
+        data_range = np.nanmax(X, axis = 0) - data_min
+        # near constant columns keep a scale of 1, like sklearn
+        data_range[data_range < 10 * np.finfo(np.float64).eps] = 1.0
+        scale = (high - low) / data_range
+        return cls(scale, low - data_min * scale)
+
+    def transform(self, X):
+        X = np.array(X, dtype = np.float64)
+        X *= self.scale_
+        X += self.min_
+        return X
+
+    def inverse_transform(self, X):
+        X = np.array(X, dtype = np.float64)
+        X -= self.min_
+        X /= self.scale_
+        return X
+
+    def transform_value(self, value, column = 0):
+        return float(value) * self._scale[column] + self._offset[column]
+
+    def inverse_value(self, value, column = 0):
+        return (float(value) - self._offset[column]) / self._scale[column]
+
+    def transform_row(self, row):
+        return [
+            float(value) * scale + offset
+            for value, scale, offset in zip(row, self._scale, self._offset)
+        ]
@@ -0,0 +1,131 @@
+"""
+Buy, sell or hold simulation over precomputed action logits.
+
+The model is linear, so the logits of a step are a part fixed by the window
+features, computed for every step up front, plus the three rollout inputs,
+inventory size and the z-scores of mean bought price and money, times a 3x3
+matrix. What is left per step is scalar work, compiled with numba when it is
+installed and run as a plain Python loop over lists otherwise. numba is
+imported on the first simulation, so serving never pays for it.
+"""
+
+import numpy as np
+
+
+def _simulate(
+    logits_hold, logits_buy, logits_sell, rollout, prices, initial_money,
+    mean, std, buy_until, bought, invests, buys, sells,
+):
+    # bought is the fifo inventory between head and tail, rollout the 3x3
+    # rollout weights row by row, outputs are filled and their lengths returned
+    money = initial_money
+    head = 0
+    tail = 0
+    inventory_sum = 0.0
+    n_invests = 0
+    n_buys = 0
+    n_sells = 0
+    for k in range(len(prices)):
+        len_inventory = tail - head
+        mean_inventory = inventory_sum / len_inventory if len_inventory > 0 else 0.0
+        z_inventory = (mean_inventory - mean) / std
+        z_money = (money - mean) / std
+        hold = (
+            logits_hold[k] + len_inventory * rollout[0]
+            + z_inventory * rollout[3] + z_money * rollout[6]
+        )
+        buy = (
+            logits_buy[k] + len_inventory * rollout[1]
+            + z_inventory * rollout[4] + z_money * rollout[7]
+        )
+        sell = (
+            logits_sell[k] + len_inventory * rollout[2]
+            + z_inventory * rollout[5] + z_money * rollout[8]
+        )
+        # first maximum, like np.argmax
+        price = prices[k]
+        if buy > hold and buy >= sell:
+            if money >= price and k < buy_until:
+                bought[tail] = price
+                tail += 1
+                inventory_sum += price
+                money -= price
+                buys[n_buys] = k
+                n_buys += 1
+        elif sell > hold and sell > buy:
+            if len_inventory > 0:
+                bought_price = bought[head]
+                head += 1
+                inventory_sum -= bought_price
+                if head == tail:
+                    inventory_sum = 0.0
+                money += price
+                invests[n_invests] = ((price - bought_price) / bought_price) * 100
+                n_invests += 1
+                sells[n_sells] = k
+                n_sells += 1
+    return money, n_invests, n_buys, n_sells
+
+
+# the compiled _simulate, None without numba, False until looked up
+_compiled = False
+
+
+def _kernel():
+    global _compiled
+    if _compiled is False:
+        try:
+            import numba
+        except ImportError:
+            _compiled = None
+        else:
+            _compiled = numba.njit(cache = True, nogil = True)(_simulate)
+    return _compiled
+
+
+def simulate(logits, rollout, prices, initial_money, mean, std, buy_until = None):
+    """
+    trade one unit per step on the first maximum of logits[k] plus the
+    rollout inputs times rollout, hold, buy, sell, at prices[k]
+
+    logits is (steps, 3), rollout (3, 3) with rows inventory size, z-score of
+    mean bought price and z-score of money. Buys only happen for steps
+    before buy_until. Returns money at the end, the percent gain of every
+    sell, and the step indices of buys and sells
+    """
+    logits = np.asarray(logits, dtype = np.float64)
+    rollout = np.ascontiguousarray(rollout, dtype = np.float64).reshape(9)
+    prices = np.ascontiguousarray(prices, dtype = np.float64)
+    steps = len(prices)
+    if buy_until is None:
+        buy_until = steps
+    columns = [np.ascontiguousarray(logits[:, action]) for action in range(3)]
+    compiled = _kernel()
+    if compiled is not None:
+        bought = np.empty(steps)
+        invests = np.empty(steps)
+        buys = np.empty(steps, dtype = np.int64)
+        sells = np.empty(steps, dtype = np.int64)
+        money, n_invests, n_buys, n_sells = compiled(
+            columns[0], columns[1], columns[2], rollout, prices,
+            float(initial_money), float(mean), float(std), int(buy_until),
+            bought, invests, buys, sells,
+        )
+    else:
+        # python floats in lists index several times faster than numpy scalars
+        bought = [0.0] * steps
+        invests = [0.0] * steps
+        buys = [0] * steps
+        sells = [0] * steps
+        money, n_invests, n_buys, n_sells = _simulate(
+            columns[0].tolist(), columns[1].tolist(), columns[2].tolist(),
+            rollout.tolist(), prices.tolist(),
+            float(initial_money), float(mean), float(std), int(buy_until),
+            bought, invests, buys, sells,
+        )
+    return (
+        money,
+        np.asarray(invests[:n_invests], dtype = np.float64),
+        np.asarray(buys[:n_buys], dtype = np.int64),
+        np.asarray(sells[:n_sells], dtype = np.int64),
+    )
@@ -0,0 +1,187 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def as_parameters(parameters):
+    """
+    parameters as a contiguous float64 block, one row per series
+    """
+    return np.ascontiguousarray(parameters, dtype = np.float64)
+
+
+def _window_features(windows, out = None):
+    # windows is (..., window_size), features are the window diffs followed
+    # by the anchor-relative diffs, exactly like the original python loops
+    window_size = windows.shape[-1]
+    if out is None:
+        out = np.empty(windows.shape[:-1] + (2 * (window_size - 1),))
+    np.subtract(
+        windows[..., 1:], windows[..., :-1], out = out[..., : window_size - 1]
+    )
+    np.subtract(
+        windows[..., 1:], windows[..., :1], out = out[..., window_size - 1 :]
+    )
+    return out
+
+
+def get_block(parameters, t, window_size = 20):
+    """
+    (n_parameters, window_size) block ending at t, edge padded on the left
+    """
+    d = t - window_size + 1
+    if isinstance(parameters, np.ndarray):
+        block = parameters[:, max(d, 0) : t + 1]
+    else:
+        block = [parameter[max(d, 0) : t + 1] for parameter in parameters]
+    block = np.asarray(block, dtype = np.float64)
+    if d < 0:
+        block = np.pad(block, ((0, 0), (-d, 0)), mode = 'edge')
+    return block
+
+
+def get_state(parameters, t, window_size = 20):
+    """
+    window features for a single index t, shape (1, n_parameters * 2 * (window_size - 1))
+    """
+    block = get_block(parameters, t, window_size)
+    return _window_features(block).reshape((1, -1))
+
+
+def get_states(parameters, start = 0, stop = None, window_size = 20):
+    """
+    window features for every index in range(start, stop), one row per index,
+    row i is bit-identical to get_state(parameters, start + i, window_size)
+    """
+    parameters = as_parameters(parameters)
+    length = parameters.shape[1]
+    if stop is None:
+        stop = length
+    lo = max(start - window_size + 1, 0)
+    padded = parameters[:, lo:stop]
+    pad = window_size - 1 - (start - lo)
+    if pad > 0:
+        padded = np.pad(padded, ((0, 0), (pad, 0)), mode = 'edge')
+    windows = sliding_window_view(padded, window_size, axis = 1)
+    features = _window_features(windows)
+    # (n_parameters, n_states, features) -> (n_states, n_parameters * features)
+    return np.ascontiguousarray(features.transpose(1, 0, 2)).reshape(
+        (features.shape[1], -1)
+    )
+
+
+class StreamingState:
+    """
+    live window over a tick stream, each push updates the window features and
+    the inventory summary in place so a tick costs the same fixed amount of
+    work with no allocations
+
+    the window is a ring buffer written twice, at i and i + window_size, so
+    the ordered window is always one contiguous slice
+
+    the inventory is _bought[_sold:]. _bought is only ever appended to, and
+    replaced by a fresh list when sold prices pile up, so a (list, start,
+    stop) slice of it taken by inventory_slice stays valid after later trades
+    """
+
+    def __init__(self, n_parameters, window_size = 20, mean = 0.0, std = 1.0):
+        self.window_size = window_size
+        self.mean = mean
+        self.std = std
+        self._buffer = np.zeros((n_parameters, 2 * window_size))
+        self._n_features = n_parameters * 2 * (window_size - 1)
+        # state handed to the model, the window features are a view into it
+        self.state = np.zeros((1, self._n_features + 3))
+        self._features = self.state[0, : self._n_features].reshape(
+            (n_parameters, 2 * (window_size - 1))
+        )
+        self.reset()
+
+    def reset(self):
+        self._position = 0
+        self.count = 0
+        self._bought = []
+        self._sold = 0
+        self._inventory_sum = 0.0
+
+    @property
+    def ready(self):
+        return self.count >= self.window_size
+
+    @property
+    def inventory(self):
+        """
+        bought prices still held, oldest first, as a new list
+        """
+        return self._bought[self._sold :]
+
+    @property
+    def len_inventory(self):
+        return len(self._bought) - self._sold
+
+    def inventory_slice(self):
+        """
+        (list, start, stop), list[start:stop] is the inventory now, whatever
+        is traded later
+        """
+        return self._bought, self._sold, len(self._bought)
+
+    @property
+    def window(self):
+        """
+        (n_parameters, count) view of the buffered ticks, oldest first
+        """
+        if self.ready:
+            return self._buffer[:, self._position : self._position + self.window_size]
+        return self._buffer[:, : self.count]
+
+    def push(self, values):
+        position = self._position
+        self._buffer[:, position] = values
+        self._buffer[:, position + self.window_size] = values
+        self._position = (position + 1) % self.window_size
+        if self.count < self.window_size:
+            self.count += 1
+        if self.ready:
+            _window_features(self.window, out = self._features)
+
+    def restore(self, buffer, position, count, inventory, inventory_sum):
+        """
+        put back a state read from _buffer, _position, count, inventory and
+        _inventory_sum of another stream over the same parameters
+        """
+        self._buffer[:] = buffer
+        self._position = position
+        self.count = count
+        self._bought = list(inventory)
+        self._sold = 0
+        self._inventory_sum = inventory_sum
+        if self.ready:
+            _window_features(self.window, out = self._features)
+
+    def buy(self, price):
+        self._bought.append(price)
+        self._inventory_sum += price
+
+    def sell(self):
+        price = self._bought[self._sold]
+        self._sold += 1
+        self._inventory_sum -= price
+        if self._sold == len(self._bought):
+            self._inventory_sum = 0.0
+        if self._sold > 64 and self._sold * 2 > len(self._bought):
+            # a new list, slices handed out keep the old one
+            self._bought = self._bought[self._sold :]
+            self._sold = 0
+        return price
+
+    def get_state(self, capital):
+        """
+        (1, n_features + 3) state for the latest tick, reused between calls
+        """
+        n = self._n_features
+        len_inventory = len(self._bought) - self._sold
+        mean_inventory = self._inventory_sum / len_inventory if len_inventory else 0
+        self.state[0, n] = len_inventory
+        self.state[0, n + 1] = (mean_inventory - self.mean) / self.std
+        self.state[0, n + 2] = (capital - self.mean) / self.std
+        return self.state
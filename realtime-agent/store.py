@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    symbol TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    buffer BLOB NOT NULL,
+    inventory BLOB NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store (
+    epoch TEXT NOT NULL
+)
+"""
+
+
+class StateStore:
+    """
+    agent trading state in a directory of sqlite files, one per symbol,
+    shared by every worker process
+
+    a change runs on the state the agent caught up with by a read, and only
+    its result is written under the symbol's write lock, if the stored
+    version is still the one the change started from. Otherwise another
+    process got in first, the agent catches up with its state and the change
+    runs again. Each agent remembers the version it last saw, so an agent
+    that keeps its symbol pays for the write only, and symbols never wait on
+    each other
+
+    versions count up from 0 in a new file, epoch is drawn once per file, so
+    (epoch, version) never names two different states of a symbol. A row
+    saved by an agent over other data, see Agent.data_hash, is not restored
+    """
+
+    def __init__(self, path, timeout = 30.0):
+        self.path = path
+        self.timeout = timeout
+        os.makedirs(path, exist_ok = True)
+        self._local = threading.local()
+        self._epochs = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, symbol):
+        connection = sqlite3.connect(
+            os.path.join(self.path, '%s.sqlite' % symbol),
+            timeout = self.timeout,
+            isolation_level = None,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def connection(self, symbol):
+        # connections are per thread and symbol, and never carried over a fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connections = {}
+            local.pid = os.getpid()
+        connection = local.connections.get(symbol)
+        if connection is None:
+            connection = local.connections[symbol] = self._connect(symbol)
+        return connection
+
+    def epoch(self, symbol):
+        """
+        drawn once per symbol file, the first time any process opens it
+        """
+        with self._lock:
+            epoch = self._epochs.get(symbol)
+            if epoch is None:
+                connection = self.connection(symbol)
+                connection.executescript(_SCHEMA)
+                connection.execute('BEGIN IMMEDIATE')
+                row = connection.execute('SELECT epoch FROM store').fetchone()
+                if row is None:
+                    row = (os.urandom(4).hex(),)
+                    connection.execute('INSERT INTO store VALUES (?)', row)
+                connection.execute('COMMIT')
+                epoch = self._epochs[symbol] = row[0]
+        return epoch
+
+    def _version(self, connection, symbol):
+        row = connection.execute(
+            'SELECT version FROM agents WHERE symbol = ?', (symbol,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def _read(self, connection, symbol):
+        row = connection.execute(
+            'SELECT version, buffer, inventory, state FROM agents WHERE symbol = ?',
+            (symbol,),
+        ).fetchone()
+        if row is None:
+            return None
+        version, buffer, inventory, state = row
+        values = json.loads(state)
+        arrays = {
+            'buffer': np.frombuffer(buffer, dtype = np.float64).reshape(values.pop('shape')),
+            'inventory': np.frombuffer(inventory, dtype = np.float64),
+        }
+        return version, arrays, values
+
+    def _catch_up(self, symbol, agent):
+        self.epoch(symbol)
+        connection = self.connection(symbol)
+        if agent.store_version and self._version(connection, symbol) == agent.store_version:
+            # nothing changed since, skip decoding the state
+            return agent.store_version
+        stored = self._read(connection, symbol)
+        if stored is None:
+            # nothing stored yet, start from the initial state
+            if agent.store_version != 0:
+                agent._reset(agent.initial_money)
+            return 0
+        version, arrays, values = stored
+        if version != agent.store_version:
+            if values.get('data') == agent.data_hash:
+                agent._restore(arrays, values)
+            else:
+                # saved over other data, an older CSV or scaler, start over
+                # and let the next change replace it
+                agent._reset(agent.initial_money)
+        return version
+
+    def refresh(self, symbol, agent):
+        """
+        bring agent up to the stored state, called with the agent lock held
+        """
+        agent.store_version = self._catch_up(symbol, agent)
+
+    def _write(self, symbol, version, row):
+        # True when row was stored as version + 1, False when the stored
+        # version is no longer version
+        connection = self.connection(symbol)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self._version(connection, symbol) != version:
+                connection.execute('ROLLBACK')
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO agents VALUES (?, ?, ?, ?, ?)',
+                (symbol, version + 1) + row,
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return True
+
+    def change(self, symbol, agent, change):
+        """
+        change() on agent, stored as the next version, called with the agent
+        lock held. change runs again when another process stored a change
+        of symbol in the meantime
+        """
+        while True:
+            self.refresh(symbol, agent)
+            try:
+                result = change()
+                arrays, values = agent._snapshot()
+                values['shape'] = list(arrays['buffer'].shape)
+                row = (
+                    arrays['buffer'].tobytes(),
+                    arrays['inventory'].tobytes(),
+                    json.dumps(values),
+                )
+                stored = self._write(symbol, agent.store_version, row)
+            except BaseException:
+                # the agent may be half way through the change, reload it next time
+                agent.store_version = None
+                raise
+            if stored:
+                agent.store_version += 1
+                return result
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Agent Test Script
+This script checks the live trading agent under concurrent and streamed use,
+and its backtests.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from agent import agent_from_csv
+from backtest import BacktestCache
+from dataset import read_columns
+from model import Model, load_model
+from registry import AgentRegistry
+from routes import MAX_BATCH_TICKS, api
+from store import StateStore
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_agent(symbol='TWTR'):
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    return agent_from_csv(model, os.path.join(script_dir, '%s.csv' % symbol))
+
+
+def trading_state(view):
+    # versions and decision timestamps differ between agents that trade alike
+    return view.balance, view.inventory, view.queue
+
+
+def test_concurrent_trades_are_serialized():
+    """Threads trading one agent must end where one thread would."""
+    ticks = list(zip(*read_columns(os.path.join(script_dir, 'TWTR.csv'))))[:40]
+    # every thread sends the same ticks, so any serial order gives one result
+    threads, per_thread = 8, 40
+    tick = list(ticks[-1])
+
+    expected = make_agent()
+    for _ in range(threads * per_thread):
+        expected.trade(tick)
+
+    agent = make_agent()
+    views = []
+    stop = threading.Event()
+
+    def write():
+        for _ in range(per_thread):
+            agent.trade(tick)
+
+    def read():
+        while not stop.is_set():
+            views.append(agent.view())
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    writers = [threading.Thread(target=write) for _ in range(threads)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    stop.set()
+    reader.join()
+
+    assert trading_state(agent.view()) == trading_state(expected.view())
+    assert agent.view().version == expected.view().version
+    assert agent._stream.count == expected._stream.count
+    for view in views:
+        assert len(view.queue) <= 20
+        assert isinstance(view.inventory, list)
+    print(f"✓ {threads} threads trading one agent match a serial run ({len(views)} reads)")
+
+
+def test_view_is_immutable_snapshot():
+    """A view taken before a trade must not change after it."""
+    agent = make_agent()
+    ticks = list(zip(*read_columns(os.path.join(script_dir, 'TWTR.csv'))))
+    for tick in ticks[:30]:
+        agent.trade(list(tick))
+    view = agent.view()
+    queue = [list(row) for row in view.queue]
+    inventory = list(view.inventory)
+    # lists are built on first read, a view first read after trades is unchanged too
+    unread = agent.view()
+    for tick in ticks[30:60]:
+        agent.trade(list(tick))
+    assert view.queue == queue and view.inventory == inventory
+    assert unread.queue == queue and unread.inventory == inventory
+    assert agent.view().queue != queue
+    print("✓ published views are not changed by later trades")
+
+
+def test_state_store_shares_agents():
+    """Agents in step through a StateStore must trade like one agent."""
+    ticks = list(zip(*read_columns(os.path.join(script_dir, 'TWTR.csv'))))
+    expected = make_agent()
+    directory = tempfile.mkdtemp()
+    try:
+        store = StateStore(os.path.join(directory, 'state'))
+        # two agents for one symbol, as two worker processes would hold
+        workers = [make_agent(), make_agent()]
+        for worker in workers:
+            worker.symbol = 'TWTR'
+            worker.state_store = store
+        for i, tick in enumerate(ticks):
+            result = workers[i % 3 % 2].trade(list(tick))
+            expected_result = expected.trade(list(tick))
+            assert result['action'] == expected_result['action'], i
+            assert result['balance'] == expected_result['balance'], i
+            if i == 100:
+                workers[1].reset_capital(5000)
+                expected.reset_capital(5000)
+        for worker in workers:
+            assert trading_state(worker.view()) == trading_state(expected.view())
+        assert workers[0].view().version == workers[1].view().version == len(ticks) + 1
+
+        # another process stores a tick while this one predicts, the change
+        # runs again on top of it
+        late = []
+
+        def change():
+            if not late:
+                late.append(workers[1].trade(list(ticks[0])))
+            return workers[0]._trade(ticks[1][0], workers[0].scaler.transform_row(ticks[1]))
+
+        result = store.change('TWTR', workers[0], change)
+        expected_late = expected.trade(list(ticks[0]))
+        expected_result = expected.trade(list(ticks[1]))
+        assert late[0]['action'] == expected_late['action']
+        assert result['action'] == expected_result['action']
+        assert result['balance'] == expected_result['balance']
+        assert workers[0].store_version == len(ticks) + 3
+        for worker in workers:
+            view = worker.view()
+            assert view.balance == expected.view().balance
+            assert view.inventory == expected.view().inventory
+    finally:
+        shutil.rmtree(directory)
+    print("✓ agents sharing a state store trade like a single agent")
+
+
+def test_state_store_skips_stale_rows():
+    """State saved over other data must not be restored."""
+    ticks = list(zip(*read_columns(os.path.join(script_dir, 'TWTR.csv'))))[:40]
+    directory = tempfile.mkdtemp()
+    try:
+        store = StateStore(os.path.join(directory, 'state'))
+        # an older process traded TWTR over the AMD data
+        stale = make_agent('AMD')
+        stale.symbol = 'TWTR'
+        stale.state_store = store
+        for tick in ticks:
+            stale.trade(list(tick))
+
+        agent = make_agent()
+        agent.symbol = 'TWTR'
+        agent.state_store = store
+        expected = make_agent()
+        assert trading_state(agent.view()) == trading_state(expected.view())
+        for tick in ticks[:25]:
+            assert agent.trade(list(tick))['action'] == expected.trade(list(tick))['action']
+        # the next change replaced the stale row
+        fresh = make_agent()
+        fresh.symbol = 'TWTR'
+        fresh.state_store = store
+        assert trading_state(fresh.view()) == trading_state(expected.view())
+
+        arrays, values = stale.snapshot()
+        try:
+            make_agent().restore(arrays, values)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('a snapshot over other data was restored')
+    finally:
+        shutil.rmtree(directory)
+    print("✓ stored state saved over other data is not restored")
+
+
+def make_client(max_long_polls = 16):
+    app = Flask(__name__)
+    app.config['MAX_LONG_POLLS'] = max_long_polls
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    app.config['AGENTS'] = AgentRegistry(model, script_dir)
+    app.config['SYMBOL'] = 'TWTR'
+    app.register_blueprint(api)
+    return app.test_client()
+
+
+def test_trade_batch():
+    """/trade/batch must trade like per tick /trade and change nothing when rejected."""
+    ticks = [list(tick) for tick in zip(*read_columns(os.path.join(script_dir, 'TWTR.csv')))][:60]
+    amd = [list(tick) for tick in zip(*read_columns(os.path.join(script_dir, 'AMD.csv')))][:40]
+    client = make_client()
+    expected = make_client()
+    results = client.post('/trade/batch', json = {'symbols': {'twtr': ticks, 'AMD': amd}})
+    assert results.status_code == 200
+    results = results.get_json()['results']
+    assert sorted(results) == ['AMD', 'twtr']
+    for symbol, symbol_ticks in (('twtr', ticks), ('AMD', amd)):
+        result = results[symbol]
+        assert len(result['decisions']) == len(symbol_ticks)
+        for tick, decision in zip(symbol_ticks, result['decisions']):
+            single = expected.get(
+                '/trade?symbol=%s&data=%s' % (symbol, json.dumps(tick))
+            ).get_json()
+            assert decision['action'] == single['action'], symbol
+            assert decision['balance'] == single['balance'], symbol
+        inventory = expected.get('/inventory?symbol=%s' % symbol).get_json()
+        assert result['inventory'] == inventory, symbol
+
+    etag = client.get('/state').headers['ETag']
+    response = client.post('/trade/batch', json = {'ticks': []})
+    assert response.status_code == 200 and response.get_json()['decisions'] == []
+    assert response.get_json()['balance'] == client.get('/balance').get_json()
+    response = client.post('/trade/batch', json = {'symbols': {'TWTR': [], 'AMD': []}})
+    assert response.status_code == 200
+    rejected = [
+        ({'symbols': {'TWTR': ticks, 'AMD': [[1, 2, 3]]}}, 400),
+        ({'symbols': {'TWTR': ticks, 'AMD': [[1, True]]}}, 400),
+        ({'symbols': {'TWTR': ticks, 'ZZZ': ticks}}, 404),
+        ({'symbols': {'TWTR': ticks, 'AMD': [[1.0, 2]] * MAX_BATCH_TICKS}}, 413),
+        ({'ticks': 'no'}, 400),
+        ({}, 400),
+    ]
+    for body, status in rejected:
+        assert client.post('/trade/batch', json = body).status_code == status, body
+    # NaN and Infinity are valid JSON to the parser but not prices
+    for value in ('NaN', 'Infinity', '-Infinity'):
+        body = '{"symbols": {"TWTR": [[30, 1], [%s, 1]]}}' % value
+        response = client.post('/trade/batch', data = body, content_type = 'application/json')
+        assert response.status_code == 400, value
+        response = client.get('/trade?data=[%s,1]' % value)
+        assert response.status_code == 400, value
+    # neither the empty nor the rejected batches changed the agent
+    assert client.get('/state', headers = {'If-None-Match': etag}).status_code == 304
+    print(f"✓ /trade/batch matches {len(ticks) + len(amd)} /trade calls and rejects atomically")
+
+
+def test_trade_stream_matches_batch():
+    """/trade/stream must answer every line in order like /trade/batch."""
+    ticks = [list(tick) for tick in zip(*read_columns(os.path.join(script_dir, 'TWTR.csv')))]
+    amd = [list(tick) for tick in zip(*read_columns(os.path.join(script_dir, 'AMD.csv')))]
+    lines = []
+    for i, tick in enumerate(ticks):
+        lines.append(json.dumps(tick))
+        if i < len(amd):
+            lines.append(json.dumps({'symbol': 'AMD', 'tick': amd[i]}))
+    lines[5:5] = ['not json', '', json.dumps({'symbol': 'ZZZ', 'tick': [1, 2]}), '[NaN, 1]']
+    response = make_client().post(
+        '/trade/stream?symbol=TWTR', data='\n'.join(lines) + '\n'
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r.get('line') for r in results if 'error' in r] == [6, 8, 9]
+
+    expected = make_client()
+    batches = {
+        'TWTR': expected.post('/trade/batch', json={'ticks': ticks}).get_json(),
+        'AMD': expected.post('/trade/batch', json={'ticks': amd, 'symbol': 'AMD'}).get_json(),
+    }
+    for symbol, batch in batches.items():
+        streamed = [r for r in results if r.get('symbol') == symbol]
+        assert len(streamed) == len(batch['decisions']), symbol
+        for result, decision in zip(streamed, batch['decisions']):
+            assert result['action'] == decision['action'], symbol
+            assert result['balance'] == decision['balance'], symbol
+    assert make_client().post('/trade/stream?symbol=ZZZ', data='[1, 2]\n').status_code == 404
+    print(f"✓ /trade/stream answers {len(results)} lines in order")
+
+
+def test_trade_ws():
+    """/trade/ws must answer every message in order and close on oversized ones."""
+    from simple_websocket import Client, ConnectionClosed
+    from werkzeug.serving import make_server
+
+    from routes import MAX_STREAM_LINE
+
+    ticks = [list(tick) for tick in zip(*read_columns(os.path.join(script_dir, 'TWTR.csv')))][:80]
+    app = make_client().application
+    server = make_server('127.0.0.1', 0, app, threaded = True)
+    thread = threading.Thread(target = server.serve_forever)
+    thread.start()
+    try:
+        url = 'ws://127.0.0.1:%d/trade/ws?symbol=TWTR' % server.server_port
+        ws = Client.connect(url)
+        try:
+            results = []
+            for tick in ticks:
+                ws.send(json.dumps(tick))
+                results.append(json.loads(ws.receive(timeout = 10)))
+            ws.send('not json')
+            assert json.loads(ws.receive(timeout = 10)) == {'error': 'Invalid JSON format'}
+            ws.send(json.dumps({'symbol': 'ZZZ', 'tick': [1, 2]}))
+            assert 'unknown symbol' in json.loads(ws.receive(timeout = 10))['error']
+            ws.send('[1, Infinity]')
+            assert 'error' in json.loads(ws.receive(timeout = 10))
+        finally:
+            ws.close()
+        batch = make_client().post('/trade/batch', json = {'ticks': ticks}).get_json()
+        assert [r['action'] for r in results] == [d['action'] for d in batch['decisions']]
+        assert [r['balance'] for r in results] == [d['balance'] for d in batch['decisions']]
+        assert all(r['symbol'] == 'TWTR' for r in results)
+
+        ws = Client.connect(url)
+        ws.send('[' + ' ' * MAX_STREAM_LINE + '1, 2]')
+        try:
+            ws.receive(timeout = 10)
+        except ConnectionClosed as e:
+            assert e.reason == 1009
+        else:
+            ws.close()
+            raise AssertionError('an oversized message was answered')
+    finally:
+        server.shutdown()
+        thread.join()
+    print(f"✓ /trade/ws answers {len(results)} ticks in order and closes on oversized messages")
+
+
+def test_state_long_poll():
+    """/state must answer 304 until the agent changes, and wake on a change."""
+    client = make_client()
+    response = client.get('/state')
+    assert response.status_code == 200
+    state = response.get_json()
+    assert state['inventory']['count'] == 0 and state['last_decision'] is None
+    etag = response.headers['ETag']
+
+    response = client.get('/state', headers = {'If-None-Match': etag})
+    assert response.status_code == 304 and response.headers['ETag'] == etag
+
+    start = time.perf_counter()
+    response = client.get('/state?wait=0.2', headers = {'If-None-Match': etag})
+    assert response.status_code == 304
+    assert time.perf_counter() - start >= 0.2
+
+    agent = client.application.config['AGENTS'].get('TWTR')
+    start = time.perf_counter()
+    for timeout in (float('nan'), float('inf')):
+        assert agent.wait(agent.view().version, timeout).version == agent.view().version
+    assert time.perf_counter() - start < 1
+
+    def trade():
+        time.sleep(0.1)
+        client.get('/trade?data=[33.42,13407500]')
+
+    thread = threading.Thread(target = trade)
+    thread.start()
+    start = time.perf_counter()
+    response = client.get('/state?wait=10', headers = {'If-None-Match': etag})
+    waited = time.perf_counter() - start
+    thread.join()
+    assert response.status_code == 200 and waited < 5
+    assert response.headers['ETag'] != etag
+    state = response.get_json()
+    assert state['version'] > 0
+    assert state['last_decision']['action'] == 'fail'
+
+    client = make_client(max_long_polls = 0)
+    etag = client.get('/state').headers['ETag']
+    start = time.perf_counter()
+    response = client.get('/state?wait=10', headers = {'If-None-Match': etag})
+    assert response.status_code == 304 and 'Retry-After' in response.headers
+    assert time.perf_counter() - start < 5
+    print(f"✓ /state long poll woke {waited * 1000:.0f} ms after the request")
+
+
+def test_backtest_is_cached():
+    """Backtests must stay silent, match buy and be cached per model and data."""
+    agent = make_agent()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        buys, sells, total_gains, invest = agent.buy()
+        result = agent.backtest()
+    assert output.getvalue().count('\n') == len(buys) + len(sells)
+    assert (result['buys'], result['sells']) == (buys, sells)
+    assert result['total_gains'] == total_gains and result['investment'] == invest
+    assert len(result['gains']) == len(sells)
+    assert len(result['equity']) == len(agent.trend) - 1
+    assert result['equity'][0] == agent.initial_money
+
+    cache = BacktestCache(max_entries = 2)
+    assert cache.get(agent) is cache.get(agent)
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.get(agent, 1000)
+    cache.get(make_agent('AMD'))
+    assert cache.get(agent) is not result and cache.misses == 4
+    # other weights make another key
+    model = Model(1, 1, 1)
+    model.weights = [w + 0.01 for w in agent.model.get_weights()]
+    other = make_agent()
+    other.model = model
+    key = cache.key(other, None)
+    assert key != cache.key(agent, None) and cache.key(other, None) == key
+    # hashes are kept per model and per data, replaced weights or data count
+    model.weights[1] = model.weights[1] + 0.01
+    assert cache.key(other, None) != key
+    key = cache.key(other, None)
+    amd = make_agent('AMD')
+    other.change_data(amd.timeseries, amd.skip, amd.initial_money, amd.real_trend, amd.minmax)
+    assert cache.key(other, None) != key
+
+    client = make_client()
+    response = client.get('/backtest?money=200')
+    assert response.status_code == 200 and response.get_json()['symbol'] == 'TWTR'
+    etag = response.headers['ETag']
+    assert client.get('/backtest?money=200', headers = {'If-None-Match': etag}).status_code == 304
+    for money in ('abc', 'nan', 'inf', '-inf', '-1', '0'):
+        assert client.get('/backtest?money=' + money).status_code == 400, money
+    print(f"✓ backtests are silent and cached ({len(result['equity'])} equity points)")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("Agent Test")
+    print("=" * 60)
+
+    tests = [
+        test_concurrent_trades_are_serialized,
+        test_view_is_immutable_snapshot,
+        test_state_store_shares_agents,
+        test_state_store_skips_stale_rows,
+        test_trade_batch,
+        test_trade_stream_matches_batch,
+        test_trade_ws,
+        test_state_long_poll,
+        test_backtest_is_cached,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Evolution Strategy Test Script
+This script checks the training paths of the agent against each other.
+"""
+
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import sys
+
+import numpy as np
+
+from agent import agent_from_csv, sample_episodes
+from distributed import Coordinator, Worker
+from evolution import (
+    Adam,
+    Deep_Evolution_Strategy,
+    Momentum,
+    NoiseTable,
+    centered_rank_fitness,
+)
+from model import load_model
+import simulate
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_agent(symbol='TWTR'):
+    """Build an agent on a shipped CSV with the shipped model weights."""
+    model = load_model(os.path.join(script_dir, 'model.pkl'))
+    return agent_from_csv(model, os.path.join(script_dir, '%s.csv' % symbol))
+
+
+def jittered_population(weights, size=15, sigma=0.1, seed=0):
+    """Population of jittered copies of weights."""
+    rng = np.random.RandomState(seed)
+    return [[w + sigma * rng.randn(*w.shape) for w in weights] for _ in range(size)]
+
+
+def test_batch_reward_matches_serial():
+    """The batched population rollout must score every member like get_reward."""
+    agent = build_agent()
+    weights = [w.copy() for w in agent.model.get_weights()]
+    population = jittered_population(weights)
+    serial = np.array([agent.get_reward(member) for member in population])
+    batch = agent.get_reward_batch(population)
+    assert np.allclose(serial, batch, rtol=0, atol=1e-9), np.abs(serial - batch).max()
+    print("✓ batched rewards match serial rewards")
+
+
+def test_simulated_rewards_match_serial():
+    """Kernel rewards must match serial rewards with a skip, compiled or not."""
+    agent = build_agent('AMD')
+    agent.skip = 3
+    population = jittered_population(agent.model.get_weights(), size=4, seed=1)
+    serial = np.array([agent.get_reward(member) for member in population])
+    compiled = simulate._kernel()
+    try:
+        for kernel in {compiled, None}:
+            simulate._compiled = kernel
+            batch = agent.get_reward_batch(population)
+            assert np.allclose(serial, batch, rtol=0, atol=1e-9), (kernel, np.abs(serial - batch).max())
+    finally:
+        simulate._compiled = compiled
+    assert not agent.windows.flags.writeable
+    print(f"✓ simulated rewards match serial rewards (numba {'on' if compiled else 'off'})")
+
+
+def test_batched_training_matches_serial():
+    """A few epochs of batched training must land on the serial weights."""
+    results = []
+    for batched in (False, True):
+        agent = build_agent()
+        np.random.seed(7)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.fit(3, 3, batched=batched)
+        results.append(agent.es.get_weights())
+    for serial, batch in zip(*results):
+        assert np.allclose(serial, batch, rtol=0, atol=1e-9)
+    print("✓ batched training matches serial training")
+
+
+def test_pool_training_matches_serial():
+    """Training on a two process pool must land on the serial weights."""
+    results = []
+    for workers in (None, 2):
+        agent = build_agent()
+        np.random.seed(11)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.fit(2, 2, batched=False, workers=workers)
+        results.append(agent.es.get_weights())
+    for serial, pooled in zip(*results):
+        assert np.array_equal(serial, pooled)
+    print("✓ process pool training matches serial training")
+
+
+def test_episode_rewards():
+    """Episode rewards must average per episode and keep the full length reward."""
+    agent = build_agent('AMD')
+    population = jittered_population(agent.model.get_weights(), size=4, seed=2)
+    full = agent.get_reward_batch(population)
+    agent.episodes = [(0, len(agent.trend))]
+    assert np.array_equal(agent.get_reward_batch(population), full)
+    episodes = sample_episodes(len(agent.trend), 60, 3, np.random.RandomState(0))
+    assert all(stop - start == 60 for start, stop in episodes)
+    singles = []
+    for episode in episodes:
+        agent.episodes = [episode]
+        singles.append(agent.get_reward_batch(population))
+    agent.episodes = episodes
+    assert np.allclose(agent.get_reward_batch(population), np.mean(singles, axis=0), rtol=0, atol=1e-9)
+    assert sample_episodes(100, 200, 3) == [(0, 100)]
+    for episode_length, episodes in ((60, 0), (0, 2), (-1, 2), (len(agent.trend) + 1, 2)):
+        try:
+            agent.fit(1, 1, episode_length=episode_length, episodes=episodes)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('%r episodes of %r were accepted' % (episodes, episode_length))
+    assert agent.es.before_epoch is None
+
+    results = []
+    for workers in (None, 2):
+        agent = build_agent()
+        np.random.seed(3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.fit(2, 2, workers=workers, episode_length=60, episodes=2, seed=4)
+        assert agent.episodes is None and agent.es.before_epoch is None
+        results.append(agent.es.get_weights())
+    for local, pooled in zip(*results):
+        assert np.array_equal(local, pooled)
+    print("✓ episode rewards average per episode and train alike on a pool")
+
+
+def test_update_rules():
+    """Rank shaping, mirrored sampling and optimizers must climb a simple reward."""
+    shaped = centered_rank_fitness(np.array([3.0, -10.0, 100.0, 0.5]))
+    assert np.allclose(shaped, [1 / 6, -0.5, 0.5, -1 / 6])
+
+    target = np.linspace(-1, 1, 12).reshape(3, 4)
+
+    def reward(weights):
+        return -np.sum((weights[0] - target) ** 2)
+
+    es = Deep_Evolution_Strategy([np.zeros((3, 4))], reward, 9, 0.1, 0.05)
+    es.mirrored = True
+    np.random.seed(0)
+    population = es.sample_population()
+    assert len(population) == 9
+    for k in range(0, 8, 2):
+        assert np.array_equal(population[k][0], -population[k + 1][0])
+
+    for fitness, mirrored, optimizer in (
+        (centered_rank_fitness, True, None),
+        (centered_rank_fitness, False, Momentum(0.5, weight_decay=0.01)),
+        (centered_rank_fitness, True, Adam(weight_decay=0.01)),
+    ):
+        es = Deep_Evolution_Strategy([np.zeros((3, 4))], reward, 9, 0.1, 0.05)
+        es.fitness, es.mirrored, es.optimizer = fitness, mirrored, optimizer
+        start = reward(es.get_weights())
+        for _ in range(100):
+            es.step()
+        assert reward(es.get_weights()) > start / 4, (mirrored, optimizer)
+    print("✓ rank shaping, mirrored sampling, momentum and Adam all climb")
+
+
+def test_noise_table_members_are_views():
+    """Noise table members must be zero-copy slices and update like stacked noise."""
+    agent = build_agent()
+    table = NoiseTable(size=200000, seed=1)
+    agent.es.noise_table = table
+    np.random.seed(5)
+    population = agent.es.sample_population()
+    for member in population:
+        for noise, w in zip(member, agent.es.get_weights()):
+            assert noise.shape == w.shape
+            assert np.shares_memory(noise, table.noise)
+
+    rewards = np.random.randn(len(population))
+    before = [w.copy() for w in agent.es.get_weights()]
+    agent.es.update(population, rewards)
+    normalized = (rewards - np.mean(rewards)) / (np.std(rewards) + 1e-7)
+    scale = agent.es.learning_rate / (agent.es.population_size * agent.es.sigma)
+    for index, w in enumerate(agent.es.get_weights()):
+        A = np.array([p[index] for p in population], dtype=np.float64)
+        expected = before[index] + scale * np.dot(A.T, normalized).T
+        assert np.allclose(w, expected, rtol=0, atol=1e-12)
+    print("✓ noise table members are views and update correctly")
+
+
+def _run_worker(port):
+    Worker(build_agent(), 'localhost', port).run()
+
+
+def use_rank_mirrored_adam(es):
+    """The non-default update rule the distributed test runs with."""
+    es.fitness = centered_rank_fitness
+    es.mirrored = True
+    es.optimizer = Adam(weight_decay=0.001)
+    es.learning_rate = 0.1
+
+
+def use_small_population(es):
+    """Fewer members than the distributed test has workers."""
+    es.population_size = 2
+
+
+def test_distributed_training_matches_single_node():
+    """Three socket workers exchanging seeds must reproduce a seeded local run."""
+    epochs = 2
+    for configure in (None, use_rank_mirrored_adam, use_small_population):
+        local = build_agent()
+        local.es.set_seed(3)
+        if configure:
+            configure(local.es)
+        with contextlib.redirect_stdout(io.StringIO()):
+            local.fit(epochs, epochs)
+
+        coordinator = Coordinator(build_agent(), seed=3, host='localhost', port=0)
+        if configure:
+            configure(coordinator.es)
+        workers = [
+            mp.Process(target=_run_worker, args=(coordinator.address[1],))
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            coordinator.accept(len(workers))
+            with contextlib.redirect_stdout(io.StringIO()):
+                coordinator.train(epochs, epochs)
+        finally:
+            coordinator.close()
+            for worker in workers:
+                worker.join()
+        for expected, distributed in zip(local.es.get_weights(), coordinator.es.get_weights()):
+            assert np.array_equal(expected, distributed), configure
+
+    # rules a worker cannot rebuild are refused before any worker joins
+    coordinator = Coordinator(build_agent(), seed=3, host='localhost', port=0)
+    es = coordinator.es
+    stepped = Momentum()
+    stepped.step(es.get_weights(), es.get_weights(), 0.0)
+    try:
+        for fitness, optimizer in ((lambda rewards: rewards, None), (centered_rank_fitness, stepped)):
+            es.fitness, es.optimizer = fitness, optimizer
+            try:
+                coordinator.accept(1)
+            except ValueError:
+                continue
+            raise AssertionError('an update rule workers cannot rebuild was accepted')
+    finally:
+        coordinator.close()
+    print("✓ distributed training matches a single node run, default and rank+mirrored+adam")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("Evolution Strategy Test")
+    print("=" * 60)
+
+    tests = [
+        test_batch_reward_matches_serial,
+        test_simulated_rewards_match_serial,
+        test_batched_training_matches_serial,
+        test_pool_training_matches_serial,
+        test_episode_rewards,
+        test_distributed_training_matches_single_node,
+        test_noise_table_members_are_views,
+        test_update_rules,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Metrics Test Script
+This script checks the latency histograms, their Prometheus text output and
+the sampled debug logger.
+"""
+
+import logging
+import os
+import re
+import sys
+
+from flask import Flask
+
+from metrics import Histogram, SampledLogger
+from model import load_model
+from registry import AgentRegistry
+from routes import api
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def parse_metrics(text):
+    """{(name, ((label, value), ...)): value} for every sample line."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = _SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        labels = tuple(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or ''))
+        samples[name, labels] = float(value)
+    return samples
+
+
+def series(samples, name, **labels):
+    """buckets by le, sum and count of one histogram series."""
+    wanted = set(labels.items())
+    buckets = {}
+    total = count = 0.0
+    for (sample, sample_labels), value in samples.items():
+        others = {label for label in sample_labels if label[0] != 'le'}
+        if others != wanted:
+            continue
+        if sample == name + '_bucket':
+            buckets[dict(sample_labels)['le']] = value
+        elif sample == name + '_sum':
+            total = value
+        elif sample == name + '_count':
+            count = value
+    return buckets, total, count
+
+
+def test_histogram_buckets():
+    """Observations must land in the first bucket whose bound is not below them."""
+    histogram = Histogram('test_seconds', 'Test.', ('route',), buckets = (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.observe(value, '/a"b')
+    histogram.observe(0.2, '/c')
+    buckets, total, count = series(
+        parse_metrics(histogram.render()), 'test_seconds', route = '/a\\"b'
+    )
+    assert buckets == {'0.1': 2, '1.0': 4, '+Inf': 5}
+    assert count == 5 and abs(total - 4.65) < 1e-9
+    buckets, total, count = series(parse_metrics(histogram.render()), 'test_seconds', route = '/c')
+    assert buckets == {'0.1': 0, '1.0': 1, '+Inf': 1} and count == 1
+    lines = histogram.render().splitlines()
+    assert lines[:2] == ['# HELP test_seconds Test.', '# TYPE test_seconds histogram']
+    print("✓ histogram buckets are cumulative and inclusive of their bound")
+
+
+def test_metrics_endpoint():
+    """/trade calls must show up per route and per stage in /metrics."""
+    app = Flask(__name__)
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    app.config['AGENTS'] = AgentRegistry(model, script_dir)
+    app.config['SYMBOL'] = 'TWTR'
+    app.register_blueprint(api)
+    client = app.test_client()
+
+    route = {'route': '/trade', 'method': 'GET', 'status': '200'}
+    before = parse_metrics(client.get('/metrics').get_data(as_text = True))
+    trades = 25
+    for i in range(trades):
+        assert client.get('/trade?data=[%d,1000]' % (30 + i)).status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    after = parse_metrics(response.get_data(as_text = True))
+
+    def delta(name, **labels):
+        old_buckets, old_total, old_count = series(before, name, **labels)
+        buckets, total, count = series(after, name, **labels)
+        return (
+            {le: value - old_buckets.get(le, 0) for le, value in buckets.items()},
+            total - old_total,
+            count - old_count,
+        )
+
+    buckets, total, count = delta('http_request_duration_seconds', **route)
+    assert count == trades and buckets['+Inf'] == trades and total > 0
+    bounds = [le for le in buckets if le != '+Inf']
+    assert bounds == sorted(bounds, key = float)
+    counts = [buckets[le] for le in bounds] + [buckets['+Inf']]
+    assert counts == sorted(counts)
+    # the first 19 ticks fill the window, only the rest reach predict
+    stages = {'scale': trades, 'state': trades + 6, 'predict': 6, 'serialize': trades}
+    for stage_name, expected in stages.items():
+        _, total, count = delta('agent_stage_duration_seconds', stage = stage_name)
+        assert count == expected, (stage_name, count)
+        assert total > 0, stage_name
+    print(f"✓ /metrics counts {trades} /trade requests and their stages")
+
+
+def test_sampled_logger():
+    """SampledLogger must log one call in every, and nothing when disabled."""
+    records = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    logger = logging.getLogger('test_metrics.sampled')
+    logger.propagate = False
+    logger.addHandler(Handler())
+    sampled = SampledLogger(logger, every = 10)
+    logger.setLevel(logging.INFO)
+    for i in range(25):
+        sampled.debug('call %d', i)
+    assert records == [] and sampled._count == 0
+    logger.setLevel(logging.DEBUG)
+    for i in range(25):
+        sampled.debug('call %d', i)
+    assert records == ['call 0', 'call 10', 'call 20']
+    print("✓ sampled logger logs one call in every, only when enabled")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("Metrics Test")
+    print("=" * 60)
+
+    tests = [
+        test_histogram_buckets,
+        test_metrics_endpoint,
+        test_sampled_logger,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Model Format Test Script
+This script checks the binary model and data formats against their sources.
+"""
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from agent import agent_from_csv, agent_from_parameters
+from dataset import Dataset, build_dataset, read_columns
+from model import InferenceModel, QuantizedModel, load_model
+from modelfile import load_model_file, save_model, save_quantized_model
+from quantize import agreement
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_model_file_roundtrip():
+    """model.bin must hold exactly the weights of model.pkl, read-only."""
+    expected = load_model(os.path.join(script_dir, 'model.pkl')).get_weights()
+    loaded = load_model(os.path.join(script_dir, 'model.bin')).get_weights()
+    for w, v in zip(expected, loaded):
+        assert w.shape == v.shape and np.array_equal(w, v)
+        assert not v.flags.writeable
+    print("✓ model.bin matches model.pkl")
+
+
+def test_model_file_checksum():
+    """A flipped byte in the weights must be detected."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model.bin')
+        save_model(path, load_model(os.path.join(script_dir, 'model.pkl')))
+        with open(path, 'r+b') as fopen:
+            fopen.seek(-1, os.SEEK_END)
+            last = fopen.read(1)
+            fopen.seek(-1, os.SEEK_END)
+            fopen.write(bytes([last[0] ^ 0xFF]))
+        try:
+            load_model_file(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('corrupt model file loaded')
+        load_model_file(path, verify=False)
+    finally:
+        shutil.rmtree(directory)
+    print("✓ corrupt model file is rejected")
+
+
+def test_dataset_matches_csv():
+    """Agents built from data.bin must equal agents built from the CSVs."""
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    dataset = Dataset(os.path.join(script_dir, 'data.bin'))
+    for symbol in sorted(dataset.crcs):
+        path = os.path.join(script_dir, '%s.csv' % symbol)
+        expected = agent_from_csv(model, path)
+        parameters, scaler = dataset.get(symbol, path)
+        agent = agent_from_parameters(model, parameters, scaler)
+        assert np.array_equal(agent.timeseries, expected.timeseries), symbol
+        assert np.array_equal(agent.real_trend, expected.real_trend), symbol
+        # rows are views, not copies
+        assert np.shares_memory(agent.real_trend, parameters), symbol
+        assert np.shares_memory(agent.trend, agent.timeseries), symbol
+        assert agent.initial_money == expected.initial_money, symbol
+    print("✓ data.bin matches the CSVs")
+
+
+def test_dataset_ignores_changed_csv():
+    """An entry must not be used once its CSV changes."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'TWTR.csv')
+        shutil.copy(os.path.join(script_dir, 'TWTR.csv'), path)
+        build_dataset(directory, os.path.join(directory, 'data.bin'))
+        dataset = Dataset(os.path.join(directory, 'data.bin'))
+        assert dataset.get('TWTR', path) is not None
+        with open(path, 'a') as fopen:
+            fopen.write('2019-05-24,1,1,1,1,1,1\n')
+        assert dataset.get('TWTR', path) is None
+        assert dataset.get('AMD') is None
+    finally:
+        shutil.rmtree(directory)
+    print("✓ stale data.bin entries are ignored")
+
+
+def test_inference_model_matches():
+    """float32 serving must take the float64 decisions on every CSV."""
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    inference = InferenceModel(model)
+    assert sum(w.nbytes for w in inference.get_weights()) * 2 == sum(
+        w.nbytes for w in model.get_weights()
+    )
+    for path in sorted(glob.glob(os.path.join(script_dir, '*.csv'))):
+        expected = agent_from_csv(model, path)
+        agent = agent_from_csv(inference, path)
+        for tick in zip(*read_columns(path)):
+            assert agent.trade(list(tick))['action'] == expected.trade(list(tick))['action'], path
+        states = np.random.RandomState(0).normal(size = (64, 79))
+        actions, prob = inference.predict_softmax(states)
+        expected_actions, expected_prob = model.predict_softmax(states)
+        assert np.array_equal(actions, expected_actions), path
+        assert np.allclose(prob, expected_prob, atol = 1e-4)
+    print("✓ float32 inference takes the same actions on every CSV")
+
+
+def test_quantized_model():
+    """int8 weights must round trip and keep nearly every action."""
+    model = load_model(os.path.join(script_dir, 'model.bin'))
+    quantized = QuantizedModel.quantize(model)
+    for w, q, scale in zip(model.get_weights(), quantized.weights, quantized.scales):
+        assert q.dtype == np.int8
+        assert np.abs(q * scale.astype(np.float64) - w).max() <= scale.max() / 2 + 1e-6
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model_int8.bin')
+        save_quantized_model(path, quantized)
+        loaded = load_model(path, 'float32')
+        assert isinstance(loaded, QuantizedModel)
+        for expected, weights in zip(quantized.weights + quantized.scales, loaded.weights + loaded.scales):
+            assert np.array_equal(expected, weights)
+    finally:
+        shutil.rmtree(directory)
+    same_state, _, decisions = agreement(model, loaded, os.path.join(script_dir, 'TWTR.csv'))
+    assert decisions > 200 and same_state >= 0.95, same_state
+    print(f"✓ int8 model agrees on {same_state:.2%} of TWTR decisions")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("Model Format Test")
+    print("=" * 60)
+
+    tests = [
+        test_model_file_roundtrip,
+        test_model_file_checksum,
+        test_dataset_matches_csv,
+        test_dataset_ignores_changed_csv,
+        test_inference_model_matches,
+        test_quantized_model,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
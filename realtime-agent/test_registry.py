@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Agent Registry Test Script
+This script checks that the registry finds, bounds and evicts per symbol
+agents, and that the routes answer 404 for symbols it does not know.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from flask import Flask
+
+from model import Model, load_model
+from modelfile import save_model
+from registry import AgentRegistry, UnknownSymbol, agent_nbytes
+from routes import api
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SYMBOLS = ['AMD', 'FB', 'TWTR']
+
+
+def make_data_dir():
+    directory = tempfile.mkdtemp()
+    for symbol in SYMBOLS:
+        shutil.copy(os.path.join(script_dir, '%s.csv' % symbol), directory)
+    return directory
+
+
+def load_default_model():
+    return load_model(os.path.join(script_dir, 'model.bin'))
+
+
+def test_symbols_are_normalized():
+    """Symbols must be upper cased and anything but a CSV name rejected."""
+    directory = make_data_dir()
+    try:
+        registry = AgentRegistry(load_default_model(), directory)
+        assert registry.symbols() == SYMBOLS
+        agent = registry.get('twtr')
+        assert agent.symbol == 'TWTR' and registry.get('TWTR') is agent
+        for symbol in ('../etc', '../TWTR', 'ZZZ', '', 'TWTR.csv', 'a' * 20):
+            try:
+                registry.get(symbol)
+            except UnknownSymbol:
+                pass
+            else:
+                raise AssertionError('%r was accepted' % symbol)
+        assert registry.loaded() == ['TWTR']
+    finally:
+        shutil.rmtree(directory)
+    print("✓ symbols are upper cased and unknown or unsafe names rejected")
+
+
+def test_lru_eviction():
+    """The registry must drop least recently used agents past its bounds."""
+    directory = make_data_dir()
+    try:
+        registry = AgentRegistry(load_default_model(), directory, max_agents = 2)
+        registry.get('AMD')
+        registry.get('FB')
+        registry.get('AMD')
+        registry.get('TWTR')
+        assert registry.loaded() == ['AMD', 'TWTR']
+        assert registry.nbytes == sum(
+            agent_nbytes(registry.get(symbol), registry.model) for symbol in ('AMD', 'TWTR')
+        )
+
+        registry = AgentRegistry(load_default_model(), directory)
+        agent = registry.get('TWTR')
+        size = agent_nbytes(agent, registry.model)
+        # the window features built by a backtest were counted at load
+        agent.backtest()
+        assert agent._windows is not None
+        assert agent_nbytes(agent, registry.model) == size == registry.nbytes
+        registry.max_bytes = size * 2.5
+        registry.get('AMD')
+        registry.get('FB')
+        assert registry.loaded() == ['AMD', 'FB']
+        assert registry.nbytes <= registry.max_bytes
+        # one agent over the bound is still served
+        registry.max_bytes = 1
+        registry.get('TWTR')
+        assert registry.loaded() == ['TWTR']
+    finally:
+        shutil.rmtree(directory)
+    print("✓ agents are evicted least recently used first, by count and by bytes")
+
+
+def test_evicted_agents_keep_state():
+    """An agent reloaded after eviction must continue from its snapshot."""
+    directory = make_data_dir()
+    try:
+        registry = AgentRegistry(
+            load_default_model(),
+            directory,
+            max_agents = 1,
+            snapshot_path = os.path.join(directory, 'state.bin'),
+        )
+        agent = registry.get('TWTR')
+        for tick in zip(agent.real_trend[:40].tolist(), [1e7] * 40):
+            agent.trade(list(tick))
+        view = agent.view()
+        registry.get('AMD')
+        assert registry.loaded() == ['AMD']
+        reloaded = registry.get('TWTR')
+        assert reloaded is not agent
+        assert reloaded.view().balance == view.balance
+        assert reloaded.view().inventory == view.inventory
+        assert reloaded.view().queue == view.queue
+    finally:
+        shutil.rmtree(directory)
+    print("✓ evicted agents are restored from their snapshot")
+
+
+def test_per_symbol_model():
+    """model_<SYMBOL>.bin must be used for that symbol only."""
+    directory = make_data_dir()
+    try:
+        default = load_default_model()
+        own = Model(1, 1, 1)
+        own.set_weights([w * 0.5 for w in default.get_weights()])
+        save_model(os.path.join(directory, 'model_AMD.bin'), own)
+        registry = AgentRegistry(default, directory)
+        assert registry.get('TWTR').model is default
+        model = registry.get('amd').model
+        assert model is not default
+        for w, expected in zip(model.get_weights(), own.get_weights()):
+            assert np.array_equal(w, expected)
+        # a model of its own counts towards the agent's size
+        assert agent_nbytes(registry.get('AMD'), default) > agent_nbytes(
+            registry.get('TWTR'), default
+        )
+    finally:
+        shutil.rmtree(directory)
+    print("✓ model_<SYMBOL>.bin is picked up per symbol")
+
+
+def test_unknown_symbol_routes():
+    """Every route reading an agent must answer 404 for unknown symbols."""
+    app = Flask(__name__)
+    app.config['AGENTS'] = AgentRegistry(load_default_model(), script_dir)
+    app.config['SYMBOL'] = 'TWTR'
+    app.register_blueprint(api)
+    client = app.test_client()
+    for path in (
+        '/balance', '/inventory', '/queue', '/state', '/backtest',
+        '/trade?data=[1,2]', '/reset?money=100',
+    ):
+        separator = '&' if '?' in path else '?'
+        for symbol in ('ZZZ', '..%2Fetc'):
+            response = client.get(path + separator + 'symbol=' + symbol)
+            assert response.status_code == 404, (path, symbol)
+            assert 'unknown symbol' in response.get_json()['error']
+        assert client.get(path + separator + 'symbol=twtr').status_code == 200, path
+    print("✓ read routes answer 404 for unknown symbols")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("Agent Registry Test")
+    print("=" * 60)
+
+    tests = [
+        test_symbols_are_normalized,
+        test_lru_eviction,
+        test_evicted_agents_keep_state,
+        test_per_symbol_model,
+        test_unknown_symbol_routes,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
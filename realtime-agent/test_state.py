@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+State Engine Test Script
+This script checks the vectorized window features against the original loops.
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from scaler import AffineScaler
+from state import StreamingState, get_state, get_states
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def reference_get_state(parameters, t, window_size=20):
+    """The original list based implementation the shipped model was trained on."""
+    outside = []
+    d = t - window_size + 1
+    for parameter in parameters:
+        block = (
+            parameter[d : t + 1]
+            if d >= 0
+            else -d * [parameter[0]] + parameter[0 : t + 1]
+        )
+        res = []
+        for i in range(window_size - 1):
+            res.append(block[i + 1] - block[i])
+        for i in range(1, window_size, 1):
+            res.append(block[i] - block[0])
+        outside.append(res)
+    return np.array(outside).reshape((1, -1))
+
+
+def load_parameters(path):
+    """Load [close, volume] lists from a symbol CSV."""
+    df = pd.read_csv(path)
+    return [df['Close'].tolist(), df['Volume'].tolist()]
+
+
+def test_single_index_matches_reference():
+    """get_state must be bit-identical to the original loops."""
+    for path in sorted(glob.glob(os.path.join(script_dir, '*.csv'))):
+        parameters = load_parameters(path)
+        array = np.array(parameters)
+        for t in range(len(parameters[0])):
+            expected = reference_get_state(parameters, t)
+            assert np.array_equal(get_state(parameters, t), expected), (path, t)
+            assert np.array_equal(get_state(array, t), expected), (path, t)
+    print("✓ get_state matches reference on every CSV")
+
+
+def test_range_matches_reference():
+    """get_states rows must equal get_state for every index of the range."""
+    parameters = load_parameters(os.path.join(script_dir, 'TWTR.csv'))
+    length = len(parameters[0])
+    for start, stop, window_size in [(0, None, 20), (5, 40, 20), (30, length, 7)]:
+        states = get_states(parameters, start, stop, window_size)
+        for i, t in enumerate(range(start, stop or length)):
+            expected = reference_get_state(parameters, t, window_size)
+            assert np.array_equal(states[i : i + 1], expected), (start, t)
+    print("✓ get_states matches reference for full and partial ranges")
+
+
+def test_streaming_state_matches_reference():
+    """Every pushed tick must leave the same window features as a rebuild."""
+    parameters = load_parameters(os.path.join(script_dir, 'TWTR.csv'))
+    ticks = np.array(parameters).T
+    stream = StreamingState(len(parameters), window_size=20, mean=1.5, std=2.0)
+    queue = []
+    for i, tick in enumerate(ticks):
+        stream.push(tick)
+        queue = (queue + [tick.tolist()])[-20:]
+        if i % 3 == 0:
+            stream.buy(tick[0])
+        elif i % 3 == 1 and stream.inventory:
+            stream.sell()
+        assert stream.ready == (len(queue) == 20)
+        assert np.array_equal(stream.window.T, np.array(queue)), i
+        if stream.ready:
+            expected = reference_get_state(np.array(queue).T.tolist(), 19)
+            state = stream.get_state(capital=10.0)
+            assert np.array_equal(state[:, :-3], expected), i
+            inventory = list(stream.inventory)
+            mean = np.mean(inventory) if inventory else 0
+            assert state[0, -3] == len(inventory)
+            assert np.isclose(state[0, -2], (mean - 1.5) / 2.0, rtol=0, atol=1e-9)
+            assert state[0, -1] == (10.0 - 1.5) / 2.0
+    print("✓ streaming state matches a rebuilt window on every tick")
+
+
+def test_affine_scaler_matches_minmax():
+    """AffineScaler must reproduce the fitted MinMaxScaler bit for bit."""
+    for path in sorted(glob.glob(os.path.join(script_dir, '*.csv'))):
+        rows = np.array(load_parameters(path)).T
+        minmax = MinMaxScaler(feature_range=(100, 200)).fit(rows)
+        scaler = AffineScaler.from_minmax(minmax)
+        assert np.array_equal(scaler.transform(rows), minmax.transform(rows)), path
+        scaled = minmax.transform(rows)
+        assert np.array_equal(scaler.inverse_transform(scaled), minmax.inverse_transform(scaled))
+        for row, expected in zip(rows.tolist(), scaled):
+            assert scaler.transform_row(row) == expected.tolist(), path
+            assert scaler.transform_value(row[0]) == expected[0]
+            assert scaler.inverse_value(expected[0]) == minmax.inverse_transform([[expected[0], 2]])[0, 0]
+    print("✓ affine scaler matches MinMaxScaler on every CSV")
+
+
+def test_affine_scaler_fit_matches_minmax():
+    """AffineScaler.fit must fit the same parameters as MinMaxScaler.fit."""
+    for path in sorted(glob.glob(os.path.join(script_dir, '*.csv'))):
+        rows = np.array(load_parameters(path)).T
+        minmax = MinMaxScaler(feature_range=(100, 200)).fit(rows)
+        scaler = AffineScaler.fit(rows, (100, 200))
+        assert np.array_equal(scaler.scale_, minmax.scale_), path
+        assert np.array_equal(scaler.min_, minmax.min_), path
+    constant = np.array([[1.0, 5.0], [1.0, 7.0]])
+    minmax = MinMaxScaler().fit(constant)
+    assert np.array_equal(AffineScaler.fit(constant).scale_, minmax.scale_)
+    print("✓ affine scaler fits like MinMaxScaler on every CSV")
+
+
+def test_streaming_state_restore():
+    """A stream restored from another's state must continue identically."""
+    rng = np.random.RandomState(1)
+    ticks = rng.uniform(100, 200, size=(60, 2))
+    source = StreamingState(2, window_size=20, mean=1.5, std=2.0)
+    for count in (0, 5, 35):
+        source.reset()
+        for i, tick in enumerate(ticks[:count]):
+            source.push(tick)
+            if i % 3 == 0:
+                source.buy(tick[0])
+        restored = StreamingState(2, window_size=20, mean=1.5, std=2.0)
+        restored.restore(
+            source._buffer.copy(), source._position, source.count,
+            list(source.inventory), source._inventory_sum,
+        )
+        for tick in ticks[count:]:
+            source.push(tick)
+            restored.push(tick)
+            if source.ready:
+                assert np.array_equal(source.get_state(10.0), restored.get_state(10.0))
+        assert list(source.inventory) == list(restored.inventory)
+    print("✓ restored streaming state continues identically")
+
+
+def test_inventory_slices_stay_valid():
+    """An inventory slice must keep its prices through later trades."""
+    rng = np.random.RandomState(2)
+    stream = StreamingState(2, window_size=20)
+    expected = []
+    slices = []
+    for i in range(2000):
+        # mostly buys at first, mostly sells later, so the log is compacted
+        if stream.len_inventory and rng.uniform() < i / 2000:
+            assert stream.sell() == expected.pop(0)
+        else:
+            price = rng.uniform(100, 200)
+            stream.buy(price)
+            expected.append(price)
+        if i % 50 == 0:
+            slices.append((stream.inventory_slice(), list(expected)))
+        if i == 1500:
+            stream.reset()
+            expected = []
+    assert stream.inventory == expected
+    for (bought, start, stop), inventory in slices:
+        assert bought[start:stop] == inventory
+    print("✓ inventory slices keep their prices through trades and resets")
+
+
+def main():
+    """Main test function."""
+    print("=" * 60)
+    print("State Engine Test")
+    print("=" * 60)
+
+    tests = [
+        test_single_index_matches_reference,
+        test_range_matches_reference,
+        test_streaming_state_matches_reference,
+        test_affine_scaler_matches_minmax,
+        test_affine_scaler_fit_matches_minmax,
+        test_streaming_state_restore,
+        test_inventory_slices_stay_valid,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"✗ {test.__name__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
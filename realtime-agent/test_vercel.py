@@ -7,6 +7,7 @@ This script tests if the application is ready for Vercel deployment.
 import sys
 import os
 import importlib.util
+import time
 
 def test_imports():
     """Test if all required modules can be imported."""
@@ -96,10 +97,17 @@ def test_api_loading():
         routes = [
             '/',
             '/api/status',
+            '/symbols',
+            '/metrics',
             '/balance',
             '/inventory',
             '/queue',
             '/trade',
+            '/trade/batch',
+            '/trade/stream',
+            '/trade/ws',
+            '/state',
+            '/backtest',
             '/reset'
         ]
         
@@ -122,6 +130,61 @@ def test_api_loading():
         print(f"✗ Error loading API: {e}")
         return False
 
+def test_dashboard_caching():
+    """Test that the dashboard is served static with validators."""
+    print("\nTesting dashboard caching...")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    asset = os.path.join(script_dir, 'static', 'index.html')
+    assert os.path.exists(asset), "static/index.html not found"
+
+    spec = importlib.util.spec_from_file_location("api", os.path.join(script_dir, 'api', 'index.py'))
+    api_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api_module)
+    client = api_module.app.test_client()
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    print(f"✓ Dashboard served gzipped with ETag {etag}")
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304 and not response.data
+    response = client.get('/', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    print("✓ Revalidation answers 304 Not Modified")
+
+    response = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    with open(asset, 'rb') as fopen:
+        assert response.data == fopen.read()
+    print("✓ Uncompressed dashboard matches static/index.html")
+    return True
+
+def test_state_wait_is_finite():
+    """Test that /state refuses a wait it could never finish."""
+    print("\nTesting /state wait...")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location("api", os.path.join(script_dir, 'api', 'index.py'))
+    api_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api_module)
+    client = api_module.app.test_client()
+
+    etag = client.get('/state').headers['ETag']
+    start = time.perf_counter()
+    for wait in ('nan', 'inf', '-inf'):
+        response = client.get('/state?wait=' + wait, headers={'If-None-Match': etag})
+        assert response.status_code == 400, wait
+    assert time.perf_counter() - start < 5
+    response = client.get('/state?wait=0', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    print("✓ Non-finite wait answers 400 at once")
+    return True
+
 def test_file_sizes():
     """Test if file sizes are reasonable for Vercel."""
     print("\nTesting file sizes...")
@@ -161,6 +224,8 @@ def main():
         ("Import Test", test_imports),
         ("API Structure Test", test_api_structure),
         ("API Loading Test", test_api_loading),
+        ("Dashboard Test", test_dashboard_caching),
+        ("State Wait Test", test_state_wait_is_finite),
         ("File Size Test", test_file_sizes)
     ]
     